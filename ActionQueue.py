@@ -0,0 +1,218 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+
+from Dispatcher import Dispatcher
+
+# Priority classes, lower runs first
+PRIORITY_MODERATION = 0    # Commands a moderator is waiting on
+PRIORITY_ENFORCEMENT = 1   # Automatic lock enforcement and restores
+PRIORITY_COSMETIC = 2      # Anything that can wait
+
+# Default pacing per route type as (actions, per seconds)
+ROUTE_LIMITS = {
+    "member_roles": (5, 5.0),
+    "channel": (5, 5.0),
+    "messages": (5, 5.0),
+}
+DEFAULT_ROUTE_LIMIT = (5, 5.0)
+ACTION_CONCURRENCY = 8     # Actions in flight across all routes
+BACKLOG_WARNING = 500      # Pending actions before warning about backpressure
+
+
+class Action:
+    __slots__ = ('priority', 'seq', 'route', 'key', 'run', 'description', 'future', 'queued_at', 'superseded', 'context')
+
+    def __init__(self, priority, seq, route, key, run, description, future):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.key = key
+        self.run = run
+        self.description = description
+        self.future = future
+        self.queued_at = time.monotonic()
+        self.superseded = False
+        self.context = contextvars.copy_context()  # The submitter's, so e.g. REST time is charged to its command
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class RouteBucket:
+    """Token bucket and pending actions for one rate limit route (e.g. one guild's member role edits)"""
+    __slots__ = ('rate', 'per', 'tokens', 'updated', 'pending', 'busy')
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.pending = []
+        self.busy = False
+
+    def refill(self, now):
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+
+    def next_token_at(self):
+        return self.updated + (1 - self.tokens) * self.per / self.rate
+
+    def head(self):
+        """Next action to run, dropping any that were superseded while waiting"""
+        while self.pending and self.pending[0].superseded:
+            heapq.heappop(self.pending)
+        return self.pending[0] if self.pending else None
+
+
+class ActionQueue:
+    """
+    Central scheduler for outbound moderation and role REST calls.
+    Actions are paced per route so bursts drain at the allowed rate instead of hitting 429s,
+    higher priority classes go first, and a newer action with the same key replaces a pending one
+    (e.g. an add followed by a remove of the same role only runs the remove).
+    Callers get a future they may await, or ignore for fire-and-forget.
+    """
+    def __init__(self, concurrency=ACTION_CONCURRENCY):
+        self.concurrency = concurrency
+        self.buckets = {}
+        self._by_key = {}
+        self._seq = itertools.count()
+        self._dispatcher = Dispatcher(self._dispatch)
+        self._in_flight = 0
+        self.submitted = 0
+        self.executed = 0
+        self.failed = 0
+        self.superseded = 0
+        self.max_pending = 0
+        self.total_wait = 0.0
+
+    def submit(self, route, run, priority=PRIORITY_COSMETIC, key=None, description=""):
+        """
+        Queue run (a coroutine function) on a route, e.g. ("member_roles", guild_id).
+        Returns a future with run's result.
+        """
+        self._dispatcher.start()
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        action = Action(priority, next(self._seq), route, key, run, description, future)
+
+        if key is not None:
+            previous = self._by_key.get(key)
+            if previous is not None:
+                # The newer action decides the final state, whoever waited on the old one gets its result
+                previous.superseded = True
+                self.superseded += 1
+                future.add_done_callback(lambda done, old=previous.future: _copy_result(done, old))
+            self._by_key[key] = action
+
+        bucket = self.buckets.get(route)
+        if bucket is None:
+            rate, per = ROUTE_LIMITS.get(route[0] if isinstance(route, tuple) else route, DEFAULT_ROUTE_LIMIT)
+            bucket = self.buckets[route] = RouteBucket(rate, per)
+        heapq.heappush(bucket.pending, action)
+
+        self.submitted += 1
+        pending = self.pending
+        self.max_pending = max(self.max_pending, pending)
+        if pending == BACKLOG_WARNING:
+            print(f"[ActionQueue] Backlog reached {pending} pending actions")
+        self._dispatcher.wake()
+        return future
+
+    @property
+    def pending(self):
+        return self.submitted - self.executed - self.failed - self.superseded - self._in_flight
+
+    def stats(self):
+        done = self.executed + self.failed
+        return {
+            "pending": self.pending,
+            "in_flight": self._in_flight,
+            "max_pending": self.max_pending,
+            "executed": self.executed,
+            "failed": self.failed,
+            "superseded": self.superseded,
+            "routes": len(self.buckets),
+            "avg_wait": self.total_wait / done if done else 0.0,
+        }
+
+    def stop(self):
+        self._dispatcher.stop()
+
+    async def _dispatch(self):
+        """Start the best action that may run now, returns the seconds until one might"""
+        now = time.monotonic()
+        best = None
+        best_bucket = None
+        wake_at = None
+
+        for route, bucket in list(self.buckets.items()):
+            action = bucket.head()
+            if action is None:
+                bucket.refill(now)
+                if not bucket.busy and bucket.tokens >= bucket.rate:
+                    del self.buckets[route]  # Idle and fully refilled, nothing worth keeping
+                continue
+            if bucket.busy:
+                continue
+            bucket.refill(now)
+            if bucket.tokens >= 1:
+                if best is None or action < best:
+                    best, best_bucket = action, bucket
+            else:
+                ready_at = bucket.next_token_at()
+                wake_at = ready_at if wake_at is None else min(wake_at, ready_at)
+
+        if best is not None and self._in_flight < self.concurrency:
+            heapq.heappop(best_bucket.pending)
+            best_bucket.tokens -= 1
+            best_bucket.busy = True
+            if self._by_key.get(best.key) is best:
+                del self._by_key[best.key]
+            self._in_flight += 1
+            best.context.run(asyncio.ensure_future, self._execute(best, best_bucket))
+            return 0.0  # Look for the next one right away
+
+        return None if wake_at is None else wake_at - now
+
+    async def _execute(self, action, bucket):
+        self.total_wait += time.monotonic() - action.queued_at
+        try:
+            result = await action.run()
+        except Exception as e:
+            self.failed += 1
+            print(f"[ActionQueue] {action.description or action.route} failed: {e}")
+            if not action.future.done():
+                action.future.set_exception(e)
+        else:
+            self.executed += 1
+            if not action.future.done():
+                action.future.set_result(result)
+        finally:
+            self._in_flight -= 1
+            bucket.busy = False
+            self._dispatcher.wake()
+
+
+def _consume_exception(future):
+    # Fire-and-forget callers never look at the result, don't let asyncio complain about it
+    if not future.cancelled():
+        future.exception()
+
+
+def _copy_result(source, target):
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+# Shared queue for moderation and role changes
+action_queue = ActionQueue()
@@ -0,0 +1,106 @@
+import copy
+from collections import deque
+
+# Rules applied to a guild until it configures its own, action -> (more than this many, within seconds)
+DEFAULT_RULES = {
+    "channel_delete": (3, 10),
+    "role_delete": (3, 10),
+    "ban": (3, 10),
+    "kick": (5, 10),
+    "webhook_create": (5, 30),
+}
+DEFAULT_TIMEOUT_MINUTES = 60
+MITIGATION_COOLDOWN = 300      # Seconds before the same actor can trigger mitigation again
+SWEEP_EVERY = 10000            # Observed events between sweeps of idle counters
+
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "alert_channel": None,
+    "timeout_minutes": DEFAULT_TIMEOUT_MINUTES,
+    "rules": {action: list(rule) for action, rule in DEFAULT_RULES.items()},
+    "trusted": [],
+}
+
+
+class AntiNukeEngine:
+    """
+    Sliding-window rules over the audit log stream, e.g. "more than 3 channel deletes by one actor in 10 seconds".
+    Every (guild, actor, action) keeps the timestamps of its recent events in a deque capped at the
+    rule's threshold, so checking an event is amortized O(1) and memory per actor stays bounded.
+    Guild settings are kept in storage under the "antinuke" namespace.
+    """
+    def __init__(self, storage, namespace="antinuke"):
+        self.storage = storage
+        self.namespace = namespace
+        self.configs = {int(gid): config for gid, config in storage.load_state(namespace).items()}
+        self.observed = 0
+        self.triggered = 0
+        self._windows = {}     # (guild_id, actor_id, action) -> deque of event timestamps
+        self._cooldowns = {}   # (guild_id, actor_id) -> timestamp until which the actor isn't mitigated again
+
+    def config(self, guild_id):
+        """A guild's settings with defaults filled in, changes to it aren't saved"""
+        config = copy.deepcopy(DEFAULT_CONFIG)
+        config.update(copy.deepcopy(self.configs.get(guild_id, {})))
+        return config
+
+    def enabled(self, guild_id):
+        return bool(self.configs.get(guild_id, {}).get("enabled"))
+
+    def update(self, guild_id, **changes):
+        """Change and save some of a guild's settings"""
+        config = self.config(guild_id)
+        config.update(changes)
+        self.configs[guild_id] = config
+        self.storage.set_state(self.namespace, guild_id, config)
+        # Windows sized for old thresholds are rebuilt on their next event
+        for key in [key for key in self._windows if key[0] == guild_id]:
+            del self._windows[key]
+        return config
+
+    def observe(self, guild_id, actor_id, action, at):
+        """
+        Count one audit log event at a unix timestamp.
+        Returns (count, seconds) of the rule it broke if the actor should be mitigated now, otherwise None.
+        """
+        self.observed += 1
+        if self.observed % SWEEP_EVERY == 0:
+            self._sweep(at)
+
+        config = self.configs.get(guild_id)
+        if not config or not config.get("enabled") or actor_id is None:
+            return None
+        rule = config.get("rules", {}).get(action)
+        if not rule or actor_id in config.get("trusted", ()):
+            return None
+        count, seconds = rule
+        if count <= 0:
+            return None
+
+        key = (guild_id, actor_id, action)
+        window = self._windows.get(key)
+        if window is None:
+            # Only the newest count + 1 events matter to tell if there were more than count
+            window = self._windows[key] = deque(maxlen=count + 1)
+        window.append(at)
+        while window and window[0] <= at - seconds:
+            window.popleft()
+        if len(window) <= count:
+            return None
+
+        window.clear()
+        if self._cooldowns.get((guild_id, actor_id), 0) > at:
+            return None
+        self._cooldowns[(guild_id, actor_id)] = at + MITIGATION_COOLDOWN
+        self.triggered += 1
+        return count, seconds
+
+    def _sweep(self, now):
+        # Drop counters and cooldowns nobody has touched for longer than any window
+        longest = max([seconds for config in self.configs.values() for _, seconds in config.get("rules", {}).values()] or [0])
+        for key, window in list(self._windows.items()):
+            if not window or window[-1] <= now - longest:
+                del self._windows[key]
+        for key, until in list(self._cooldowns.items()):
+            if until <= now:
+                del self._cooldowns[key]
@@ -0,0 +1,185 @@
+import asyncio
+import concurrent.futures
+import random
+import sqlite3
+import time
+
+import discord
+
+from Dispatcher import Dispatcher
+
+# Audit log ingestion configuration
+AUDIT_DB_FILE = "audit_log.db"
+AUDIT_POLL_CONCURRENCY = 4      # Guilds fetched at the same time
+AUDIT_MIN_INTERVAL = 5.0        # Seconds between polls of a busy guild
+AUDIT_MAX_INTERVAL = 120.0      # Seconds between polls of a quiet guild
+AUDIT_START_INTERVAL = 30.0
+AUDIT_MAX_PER_POLL = 500        # Entries fetched per guild per poll, the rest follow on the next one
+AUDIT_TICK = 1.0                # Seconds between checks for guilds that are due
+
+AUDIT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    user_id INTEGER,
+    target_id INTEGER,
+    reason TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_guild ON entries (guild_id, id);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    guild_id INTEGER PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+"""
+
+
+class AuditLogIngester:
+    """
+    Streams every guild's audit log into a local database and to subscribers.
+    Each poll fetches only the entries after the guild's last seen id, which is saved in the same
+    transaction as the entries so nothing is lost or stored twice across restarts. Guilds are polled
+    concurrently up to a limit, more often while they are busy and less often while they are quiet.
+    Subscribers are coroutine functions called with (guild, entry) for every new entry, oldest first.
+    """
+    def __init__(self, bot, path=AUDIT_DB_FILE, concurrency=AUDIT_POLL_CONCURRENCY):
+        self.bot = bot
+        self.path = path
+        self.subscribers = []
+        self.intervals = {}     # guild_id -> current poll interval
+        self.next_poll = {}     # guild_id -> time.monotonic() of its next poll
+        self.ingested = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._polling = set()
+        self._repoll = set()    # Guilds asked to poll again while a poll was already running
+        self._polls = set()     # Running poll tasks, kept referenced until they finish
+        self._dispatcher = Dispatcher(self._tick)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-log")
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(AUDIT_SCHEMA)
+        self.checkpoints = dict(self._db.execute("SELECT guild_id, last_id FROM checkpoints"))
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        return callback
+
+    def start(self):
+        self._dispatcher.start()
+
+    def poll_soon(self, guild_id):
+        """
+        Poll a guild right away, e.g. after a gateway event that audit logged entries may follow.
+        Its interval also drops to the minimum, so entries that show up a little after the event are
+        picked up within seconds instead of after a quiet guild's backed off interval.
+        """
+        self.intervals[guild_id] = AUDIT_MIN_INTERVAL
+        if guild_id in self._polling:
+            self._repoll.add(guild_id)
+            return
+        self.next_poll[guild_id] = 0.0
+        self._dispatcher.wake()
+
+    def stop(self):
+        self._dispatcher.stop()
+        for task in list(self._polls):
+            task.cancel()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._db.close()
+
+    async def _tick(self):
+        """Start a poll for every guild that is due"""
+        now = time.monotonic()
+        for guild in self.bot.guilds:
+            if guild.id in self._polling:
+                continue
+            if guild.id not in self.next_poll:
+                # Spread first polls out instead of hitting every guild at once
+                self.next_poll[guild.id] = now + random.uniform(0, AUDIT_MIN_INTERVAL)
+            if self.next_poll[guild.id] <= now:
+                self._polling.add(guild.id)
+                task = asyncio.ensure_future(self._poll(guild))
+                self._polls.add(task)
+                task.add_done_callback(self._polls.discard)
+        return AUDIT_TICK
+
+    async def _poll(self, guild):
+        interval = self.intervals.get(guild.id, AUDIT_START_INTERVAL)
+        delay = None
+        try:
+            async with self._semaphore:
+                entries = await self._fetch(guild)
+            if entries:
+                await self._ingest(guild, entries)
+            # Busy guilds get polled more often, quiet ones back off
+            if entries:
+                interval = max(AUDIT_MIN_INTERVAL, interval / 2)
+            else:
+                interval = min(AUDIT_MAX_INTERVAL, interval * 1.5)
+            if len(entries) >= AUDIT_MAX_PER_POLL:
+                delay = 0.0  # More are waiting, fetch them on the next tick
+        except discord.Forbidden:
+            interval = AUDIT_MAX_INTERVAL  # No View Audit Log permission here
+        except Exception as e:
+            print(f"[AuditLog] Poll failed in {guild.name}: {e}")
+        finally:
+            if guild.id in self._repoll:
+                self._repoll.discard(guild.id)
+                interval, delay = AUDIT_MIN_INTERVAL, 0.0
+                self._dispatcher.wake()
+            self.intervals[guild.id] = interval
+            self.next_poll[guild.id] = time.monotonic() + (interval if delay is None else delay)
+            self._polling.discard(guild.id)
+
+    async def _fetch(self, guild):
+        """Entries after the guild's checkpoint, oldest first"""
+        last_id = self.checkpoints.get(guild.id)
+        if last_id is None:
+            # First time seeing this guild, start from its newest entry instead of replaying history
+            newest = [entry async for entry in guild.audit_logs(limit=1)]
+            await self._save(guild.id, [], newest[0].id if newest else 0)
+            return []
+        return [entry async for entry in guild.audit_logs(limit=AUDIT_MAX_PER_POLL, after=discord.Object(id=last_id), oldest_first=True)]
+
+    async def _ingest(self, guild, entries):
+        rows = [
+            (entry.id, guild.id, entry.action.name, entry.user_id, getattr(entry.target, 'id', None),
+             entry.reason, entry.created_at.timestamp())
+            for entry in entries
+        ]
+        if not await self._save(guild.id, rows, entries[-1].id):
+            return  # The checkpoint didn't move, so the next poll fetches these entries again
+        self.ingested += len(entries)
+
+        for entry in entries:
+            for callback in self.subscribers:
+                try:
+                    await callback(guild, entry)
+                except Exception as e:
+                    print(f"[AuditLog] Subscriber {getattr(callback, '__name__', callback)} failed: {e}")
+
+    async def _save(self, guild_id, rows, last_id):
+        """Store entries and move the guild's checkpoint, returns False (leaving the checkpoint alone) if that failed"""
+        if not await asyncio.wrap_future(self._executor.submit(self._write, guild_id, rows, last_id)):
+            return False
+        self.checkpoints[guild_id] = last_id
+        return True
+
+    def _write(self, guild_id, rows, last_id):
+        try:
+            with self._db:
+                self._db.execute("BEGIN")
+                self._db.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._db.execute(
+                    "INSERT INTO checkpoints (guild_id, last_id) VALUES (?, ?) "
+                    "ON CONFLICT (guild_id) DO UPDATE SET last_id = excluded.last_id",
+                    (guild_id, last_id)
+                )
+        except sqlite3.Error as e:
+            print(f"[AuditLog] Failed to store entries for guild {guild_id}: {e}")
+            return False
+        return True
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Small in-memory cache where every entry expires after a time-to-live.
+    Bounded to maxsize entries, evicting the least recently used first.
+    """
+    def __init__(self, ttl, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key, default=None):
+        """Return a fresh cached value, or default if it's missing or expired"""
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Cache a value, optionally with its own time-to-live in seconds"""
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class AsyncCache:
+    """
+    Cache for async lookups (e.g. API calls).
+    Fresh entries are returned directly; entries past their ttl but within stale_ttl are returned
+    immediately while a single background refresh runs. Concurrent misses for the same key
+    share one in-flight fetch instead of each calling upstream.
+    """
+    def __init__(self, ttl, stale_ttl=0, negative_ttl=None, maxsize=1024):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (fresh_until, stale_until, value)
+        self._inflight = {}            # key -> task fetching it
+
+    async def get(self, key, fetch):
+        """Return the value for key, calling fetch() (a coroutine function) only when needed"""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            fresh_until, stale_until, value = entry
+            if now < fresh_until:
+                self._entries.move_to_end(key)
+                return value
+            if now < stale_until:
+                # Serve the stale value and revalidate in the background
+                self._start_fetch(key, fetch)
+                return value
+        return await asyncio.shield(self._start_fetch(key, fetch))
+
+    def peek(self, key, default=None):
+        """Return whatever is cached for key, fresh or stale, without fetching"""
+        entry = self._entries.get(key)
+        return default if entry is None else entry[2]
+
+    def set(self, key, value):
+        now = time.monotonic()
+        ttl = self.ttl if value is not None else self.negative_ttl
+        stale = self.stale_ttl if value is not None else 0
+        self._entries[key] = (now + ttl, now + ttl + stale, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _start_fetch(self, key, fetch):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, fetch))
+            # Background refreshes may have nobody awaiting them, mark their errors as handled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key, fetch):
+        try:
+            value = await fetch()
+            self.set(key, value)
+            return value
+        except Exception as e:
+            if key in self._entries:
+                # A failed background refresh keeps serving the stale value
+                print(f"Cache refresh failed for {key}: {e}")
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
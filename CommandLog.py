@@ -0,0 +1,377 @@
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from queue import Queue, Empty
+
+# Command log configuration
+LOG_DIR = 'logs'
+FLUSH_INTERVAL = 2.0     # Seconds an entry may wait in memory before being written
+FLUSH_BATCH_SIZE = 200   # Entries that force an immediate flush
+LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', '0'))  # 0 keeps logs forever
+MAX_RANGE_DAYS = 3660    # Longest date range a usage report covers, longer ones keep their newest days
+
+INDEX_DIR = os.path.join(LOG_DIR, 'index')
+
+# Only JSONL logs, the plain text logs from before are left alone
+LOG_FILE_PATTERN = re.compile(r'^logs_(\d{4}-\d{2}-\d{2})\.jsonl(\.gz)?$')
+
+_STOP = object()
+
+
+def log_files(directory=LOG_DIR):
+    """Yield (day, path) for every command log file in the directory, oldest first"""
+    if not os.path.isdir(directory):
+        return
+    for name in sorted(os.listdir(directory)):
+        match = LOG_FILE_PATTERN.match(name)
+        if match:
+            yield datetime.date.fromisoformat(match.group(1)), os.path.join(directory, name)
+
+
+def parse_date_range(args, default_days=7):
+    """
+    Turn command arguments into an inclusive (start, end) date range.
+    Accepts nothing (last default_days days), a number of days, one date, or two dates (YYYY-MM-DD).
+    Ranges are clamped to the newest MAX_RANGE_DAYS days.
+    """
+    today = datetime.date.today()
+    if not args:
+        return today - datetime.timedelta(days=default_days - 1), today
+    if len(args) == 1 and args[0].isdigit():
+        days = min(max(1, int(args[0])), MAX_RANGE_DAYS)
+        return today - datetime.timedelta(days=days - 1), today
+    start = datetime.date.fromisoformat(args[0])
+    end = datetime.date.fromisoformat(args[1]) if len(args) > 1 else start
+    if end < start:
+        start, end = end, start
+    if (end - start).days >= MAX_RANGE_DAYS:
+        start = end - datetime.timedelta(days=MAX_RANGE_DAYS - 1)
+    return start, end
+
+
+def iter_records(start=None, end=None, directory=LOG_DIR):
+    """
+    Stream structured log records between two dates (inclusive), oldest first.
+    Compressed days are read straight from their .gz file; legacy text logs are skipped.
+    """
+    paths = [path for day, path in log_files(directory)
+             if not ((start and day < start) or (end and day > end))]
+    yield from _read_records(paths)
+
+
+def _read_records(paths):
+    for path in paths:
+        if '.jsonl' not in path:
+            continue
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partially written line from a crash
+        except OSError as e:
+            print(f"Failed to read command log {path}: {e}")
+
+
+class CommandLogWriter:
+    """
+    Background sink for the command log.
+    Records are queued from the event loop and written as JSON lines by a dedicated thread in batches,
+    keeping a single open handle per day so command dispatch never touches the disk.
+    Closed days are gzip compressed and anything older than the retention window is removed.
+    """
+    def __init__(self, directory=LOG_DIR, flush_interval=FLUSH_INTERVAL, batch_size=FLUSH_BATCH_SIZE,
+                 retention_days=LOG_RETENTION_DAYS, index=None):
+        self.directory = directory
+        self.index = index
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self.queue = Queue()
+        self._thread = None
+        self._closing = None     # A closed writer that may still be draining its queue
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._day = None
+
+    def start(self):
+        """Start the writer thread if it isn't already running"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._start_thread(self._closing)
+
+    def write(self, record, when=None):
+        """Queue a log record (a JSON serializable dict). Never blocks on the filesystem."""
+        item = (when or datetime.datetime.now(), record)
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                # Not started yet, or closed and written to again (e.g. the bot reconnected)
+                self._start_thread(self._closing)
+            self.queue.put(item)
+
+    def close(self, timeout=5):
+        """Flush everything still queued and close the current day's file, a later write starts a new writer"""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+            if thread is None or not thread.is_alive():
+                return
+            self.queue.put(_STOP)
+            self._closing = thread
+        thread.join(timeout)
+
+    def _start_thread(self, previous):
+        """Start a writer with its own queue, _start_lock must be held"""
+        self.queue = Queue()
+        self._thread = threading.Thread(target=self._run, args=(self.queue, previous), name="command-log-writer", daemon=True)
+        self._thread.start()
+
+    def filename_for(self, day):
+        return os.path.join(self.directory, f"logs_{day:%Y-%m-%d}.jsonl")
+
+    def _run(self, queue, previous):
+        if previous is not None:
+            previous.join()  # Let a closed writer finish with the files first
+        self._maintain()
+        pending = []
+        deadline = None
+
+        while True:
+            timeout = self.flush_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = queue.get(timeout=timeout)
+            except Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(pending)
+                self._close_file()
+                return
+
+            if item is not None:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending and (len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(pending)
+                pending = []
+                deadline = None
+            elif not pending and self._day is not None and self._day != datetime.date.today():
+                # Midnight passed while idle, release yesterday's handle and archive it
+                self._close_file()
+                self._maintain()
+
+    def _flush(self, pending):
+        if not pending:
+            return
+        if self.index is not None:
+            try:
+                self.index.add_many(pending)
+            except Exception as e:
+                print(f"Failed to update usage index: {e}")
+        try:
+            for when, record in pending:
+                line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+                self._handle_for(when.date()).write(line + '\n')
+            self._file.flush()
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Failed to write command log: {e}")
+        if self.index is not None:
+            self.index.save()
+
+    def _handle_for(self, day):
+        if day != self._day or self._file is None:
+            rolled_over = self._day is not None and day > self._day
+            self._close_file()
+            if rolled_over:
+                self._maintain()
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(self.filename_for(day), 'a', encoding='utf-8')
+            self._day = day
+        return self._file
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        self._file = None
+        self._day = None
+
+    def _maintain(self):
+        """Compress closed days and drop files that fell out of the retention window"""
+        today = datetime.date.today()
+        cutoff = today - datetime.timedelta(days=self.retention_days) if self.retention_days > 0 else None
+
+        for day, path in list(log_files(self.directory)):
+            try:
+                if cutoff and day < cutoff:
+                    os.remove(path)
+                elif day < today and not path.endswith('.gz'):
+                    compress_file(path)
+            except OSError as e:
+                print(f"Failed to archive command log {path}: {e}")
+
+
+def compress_file(path):
+    """Gzip a closed log file next to the original, then remove the original"""
+    compressed = path + '.gz'
+    if os.path.exists(compressed):
+        # Late records for an archived day, append them as another gzip member
+        with open(path, 'rb') as src, gzip.open(compressed, 'ab') as dst:
+            shutil.copyfileobj(src, dst)
+    else:
+        temp = compressed + '.tmp'
+        with open(path, 'rb') as src, gzip.open(temp, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(temp, compressed)
+    os.remove(path)
+
+
+def top_counts(counts, limit=5):
+    """Return the largest (key, count) pairs of a usage counter"""
+    return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def _empty_aggregate():
+    return {"total": 0, "errors": 0, "commands": {}, "users": {}, "user_names": {}, "guilds": {}, "hours": {}}
+
+
+def _bump(counts, key, amount=1):
+    counts[key] = counts.get(key, 0) + amount
+
+
+class UsageIndex:
+    """
+    Persistent per-day aggregates of the command log (commands, users, guilds and hours).
+    The writer thread updates it as records are written, so range queries only merge
+    one small summary per day instead of rescanning the logs.
+    """
+    def __init__(self, directory=INDEX_DIR, log_directory=LOG_DIR):
+        self.directory = directory
+        self.log_directory = log_directory
+        self._days = {}       # date -> aggregate dict
+        self._missing = set()  # closed days with no logs at all
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def path_for(self, day):
+        return os.path.join(self.directory, f"{day:%Y-%m-%d}.json")
+
+    def add_many(self, entries):
+        """Fold (when, record) pairs into their days' aggregates"""
+        with self._lock:
+            for when, record in entries:
+                day = when.date()
+                aggregate = self._load(day)
+                self._add(aggregate, record, when)
+                self._dirty.add(day)
+
+    def save(self):
+        """Persist every aggregate changed since the last save"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshots = {day: json.dumps(self._days[day], separators=(',', ':')) for day in dirty}
+
+        for day, data in snapshots.items():
+            try:
+                _atomic_write(self.path_for(day), data)
+            except OSError as e:
+                print(f"Failed to save usage index for {day}: {e}")
+
+    def query(self, start, end):
+        """Merge the aggregates of every day between start and end (inclusive)"""
+        result = _empty_aggregate()
+        with self._lock:
+            day = start
+            while day <= end:
+                aggregate = self._load(day, create=False)
+                if aggregate:
+                    result["total"] += aggregate["total"]
+                    result["errors"] += aggregate["errors"]
+                    for key in ("commands", "users", "guilds", "hours"):
+                        for name, count in aggregate[key].items():
+                            _bump(result[key], name, count)
+                    result["user_names"].update(aggregate["user_names"])
+                day += datetime.timedelta(days=1)
+
+        # Days rebuilt from old logs are written out so the next query doesn't rebuild them again
+        if self._dirty:
+            self.save()
+        return result
+
+    def _add(self, aggregate, record, when):
+        aggregate["total"] += 1
+        if record.get("outcome") == "error":
+            aggregate["errors"] += 1
+        _bump(aggregate["commands"], record.get("command", "unknown"))
+        user_id = str(record.get("author_id"))
+        _bump(aggregate["users"], user_id)
+        if record.get("author"):
+            aggregate["user_names"][user_id] = record["author"]
+        _bump(aggregate["guilds"], str(record.get("guild_id")))
+        _bump(aggregate["hours"], str(when.hour))
+
+    def _load(self, day, create=True):
+        """Return the cached aggregate for a day, reading or rebuilding it from disk if needed"""
+        aggregate = self._days.get(day)
+        if aggregate is not None:
+            return aggregate
+        if day in self._missing and not create:
+            return None
+
+        path = self.path_for(day)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    aggregate = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                aggregate = None
+
+        if aggregate is None:
+            aggregate = self._rebuild(day)
+            if aggregate is None and not create:
+                if day < datetime.date.today():
+                    self._missing.add(day)
+                return None
+            aggregate = aggregate or _empty_aggregate()
+            self._dirty.add(day)
+
+        self._missing.discard(day)
+        self._days[day] = aggregate
+        return aggregate
+
+    def _rebuild(self, day):
+        """Build a day's aggregate from its log file, for days logged before the index existed"""
+        aggregate = None
+        paths = [os.path.join(self.log_directory, f"logs_{day:%Y-%m-%d}.jsonl{suffix}") for suffix in ('.gz', '')]
+        for record in _read_records([path for path in paths if os.path.exists(path)]):
+            if aggregate is None:
+                aggregate = _empty_aggregate()
+            try:
+                when = datetime.datetime.fromisoformat(record["timestamp"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            self._add(aggregate, record, when)
+        return aggregate
+
+
+def _atomic_write(path, data):
+    """Write a file via a temporary file so readers never see a partial write"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp = path + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+# Shared index, updated by the command log writer and read by the stats commands
+usage_index = UsageIndex()
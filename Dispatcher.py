@@ -0,0 +1,89 @@
+import asyncio
+import contextvars
+import heapq
+import time
+
+
+class Dispatcher:
+    """
+    One long running task that calls step() again and again, sleeping in between until woken.
+    step is a coroutine function returning the seconds to sleep before it runs again, None to sleep
+    until wake() is called, or 0 (or less) to run again right away. A wake() that comes while a step
+    is running cuts the next sleep short, so changes made during a step are never missed.
+    """
+    def __init__(self, step):
+        self.step = step
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            # A fresh context, otherwise the task would keep the context vars of whichever command
+            # happened to start it for the rest of its life
+            self._task = contextvars.Context().run(asyncio.ensure_future, self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = await self.step()
+            if timeout is not None and timeout <= 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+class HeapDispatcher(Dispatcher):
+    """
+    A Dispatcher that works through a heap of (due, key) entries as they come due.
+    Entries are never taken out early, a key that was cancelled or rescheduled leaves its old entry
+    behind. is_current(key, due) says whether an entry still stands, stale ones are skipped when
+    they reach the top, and run(key, due) is awaited for every entry that does.
+    """
+    def __init__(self, run, is_current, clock=time.monotonic, max_sleep=None):
+        super().__init__(self._step)
+        self.run = run
+        self.is_current = is_current
+        self.clock = clock
+        self.max_sleep = max_sleep  # Longest sleep, e.g. so wall clock jumps are noticed
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, due, key):
+        heapq.heappush(self.heap, (due, key))
+        self.wake()
+
+    def rebuild(self, entries):
+        """Replace the heap with the given (due, key) entries, e.g. to drop stale ones that piled up"""
+        self.heap = list(entries)
+        heapq.heapify(self.heap)
+        self.wake()
+
+    async def _step(self):
+        now = self.clock()
+        while self.heap and self.heap[0][0] <= now:
+            due, key = heapq.heappop(self.heap)
+            if self.is_current(key, due):
+                await self.run(key, due)
+                now = self.clock()
+
+        if not self.heap:
+            return self.max_sleep
+        timeout = self.heap[0][0] - now
+        return timeout if self.max_sleep is None else min(self.max_sleep, timeout)
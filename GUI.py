@@ -8,9 +8,11 @@ import datetime
 from queue import Queue
 import discord
 from discord.ext import commands
-import requests
 from PIL import Image, ImageTk
 from io import BytesIO
+from CommandLog import usage_index, parse_date_range, top_counts
+from LoopMonitor import loop_monitor
+from Http import http_client
 
 # Global message queue for thread communication
 message_queue = Queue()
@@ -114,10 +116,12 @@ class TerminalNavigator:
                    f"Topic: {getattr(self.current_channel, 'topic', 'None')}"
 
 def load_image_from_url(url, size=(32, 32)):
-    """Load and resize an image from URL"""
+    """Load and resize an image from URL through the bot's shared HTTP client"""
     try:
-        response = requests.get(url, timeout=5)
-        img = Image.open(BytesIO(response.content))
+        image_data = http_client.get_bytes_threadsafe(url, bot.loop if bot else None, timeout=5)
+        if image_data is None:
+            return None
+        img = Image.open(BytesIO(image_data))
         img = img.resize(size, Image.Resampling.LANCZOS)
         return ImageTk.PhotoImage(img)
     except Exception:
@@ -243,6 +247,7 @@ class BotDashboard:
         
         # Start queue checking
         self.check_queue()
+        self.update_loop_lag()
         
         # Initial status
         self.print_to_console("🚀 Osmium Bot Dashboard initialized")
@@ -345,7 +350,8 @@ class BotDashboard:
             ("Servers", "servers"),
             ("Channels", "channels"), 
             ("Users", "users"),
-            ("Commands", "commands")
+            ("Commands", "commands"),
+            ("Loop Lag", "loop_lag")
         ]
         
         for i, (label, key) in enumerate(stat_items):
@@ -539,6 +545,8 @@ class BotDashboard:
 • <bot_command>        - Execute any bot command (e.g., ban, kick, help)
 • !<bot_command>       - Execute bot command with prefix
 • history              - Show command history
+• stats [days|dates]   - Show command usage (e.g. stats 30, stats 2025-04-01 2025-04-30)
+• lag [reset]          - Show what has been blocking the event loop
 • exit                 - Disconnect bot
 
 Bot Commands:
@@ -613,6 +621,16 @@ Once in a channel, you can execute any of your bot's commands directly:
             else:
                 self.print_to_console("No command history available")
                 
+        elif cmd == "stats":
+            self.show_usage_stats(parts[1:])
+                
+        elif cmd == "lag":
+            if len(parts) > 1 and parts[1].lower() == "reset":
+                loop_monitor.reset()
+                self.print_to_console("Loop lag history cleared", "info")
+            else:
+                self.show_loop_lag()
+                
         elif cmd == "exit":
             self.disconnect_bot()
             
@@ -757,7 +775,7 @@ Once in a channel, you can execute any of your bot's commands directly:
     def autocomplete(self, event):
         """Basic autocomplete for commands"""
         current = self.command_entry.get()
-        commands = ["ls", "cd", "pwd", "clear", "status", "servers", "channels", "send", "history", "help", "exit"]
+        commands = ["ls", "cd", "pwd", "clear", "status", "servers", "channels", "send", "history", "stats", "lag", "help", "exit"]
         
         matches = [cmd for cmd in commands if cmd.startswith(current.lower())]
         if len(matches) == 1:
@@ -797,6 +815,8 @@ Once in a channel, you can execute any of your bot's commands directly:
                         self.update_bot_status(message.get("online", False))
                     elif message.get("type") == "stats_update":
                         self.update_statistics(message.get("data", {}))
+                    elif message.get("type") == "console":
+                        self.print_to_console(message.get("message", ""), message.get("tag"))
                 else:
                     # Handle plain text messages
                     self.print_to_console(str(message))
@@ -824,6 +844,37 @@ Once in a channel, you can execute any of your bot's commands directly:
             self.status_dot.itemconfig(self.status_circle, fill=self.colors['error'])
             self.status_label.config(text="Offline", fg=self.colors['error'])
             
+    def update_loop_lag(self):
+        """Refresh the loop lag indicator from the loop monitor"""
+        lag_ms = loop_monitor.lag * 1000
+        if lag_ms >= loop_monitor.threshold * 1000:
+            color = self.colors['error']
+        elif lag_ms >= 50:
+            color = self.colors['warning']
+        else:
+            color = self.colors['text_primary']
+        self.stats["loop_lag"].config(text=f"{lag_ms:.0f} ms", fg=color)
+        
+        # Schedule next update
+        self.root.after(1000, self.update_loop_lag)
+        
+    def show_loop_lag(self):
+        """Show the worst event loop stalls and what caused them"""
+        lines = []
+        lines.append("=== EVENT LOOP LAG ===")
+        lines.append(f"Current: {loop_monitor.lag * 1000:.0f} ms | Worst: {loop_monitor.max_lag * 1000:.0f} ms")
+        
+        offenders = loop_monitor.worst_offenders(10)
+        if offenders:
+            lines.append("Worst Offenders:")
+            for offender in offenders:
+                lines.append(f"  • {offender.worst * 1000:.0f} ms worst, {offender.count}x – {offender.activity}")
+                lines.append(f"      at {offender.location}")
+        else:
+            lines.append(f"No stalls over {loop_monitor.threshold * 1000:.0f} ms recorded")
+            
+        self.print_to_console("\n".join(lines), "info")
+        
     def update_statistics(self, stats_data):
         """Update statistics display"""
         for key, value in stats_data.items():
@@ -945,11 +996,57 @@ Once in a channel, you can execute any of your bot's commands directly:
             for guild in largest_servers:
                 stats.append(f"  • {guild.name}: {guild.member_count or 0} members")
                 
+            stats.append(f"Event Loop Lag: {loop_monitor.lag * 1000:.0f} ms (worst {loop_monitor.max_lag * 1000:.0f} ms)")
+            for offender in loop_monitor.worst_offenders(3):
+                stats.append(f"  • {offender.worst * 1000:.0f} ms – {offender.activity} at {offender.location}")
+                
             self.print_to_console("\n".join(stats), "info")
             
         except Exception as e:
             self.print_to_console(f"Error generating detailed stats: {e}", "error")
             
+    def show_usage_stats(self, args):
+        """Show command usage over a date range from the usage index"""
+        try:
+            start, end = parse_date_range(args)
+        except ValueError:
+            self.print_to_console("Usage: stats [days] | stats <YYYY-MM-DD> [YYYY-MM-DD]", "warning")
+            return
+            
+        # The query may rebuild days from archived logs, so it runs off the Tk thread
+        threading.Thread(target=self.build_usage_stats, args=(start, end), daemon=True).start()
+        
+    def build_usage_stats(self, start, end):
+        """Query the usage index and hand the report to the console through the message queue"""
+        try:
+            report = usage_index.query(start, end)
+            
+            stats = []
+            stats.append(f"=== COMMAND USAGE {start} -> {end} ===")
+            stats.append(f"Commands: {report['total']} ({report['errors']} failed)")
+            
+            stats.append("Top Commands:")
+            for name, count in top_counts(report["commands"]):
+                stats.append(f"  • {name}: {count}")
+                
+            stats.append("Top Users:")
+            for user_id, count in top_counts(report["users"]):
+                stats.append(f"  • {report['user_names'].get(user_id, user_id)}: {count}")
+                
+            stats.append("Top Servers:")
+            for guild_id, count in top_counts(report["guilds"]):
+                guild = bot.get_guild(int(guild_id)) if bot and guild_id.isdigit() else None
+                stats.append(f"  • {guild.name if guild else guild_id}: {count}")
+                
+            stats.append("Busiest Hours:")
+            for hour, count in top_counts(report["hours"]):
+                stats.append(f"  • {int(hour):02d}:00: {count}")
+                
+            message_queue.put({"type": "console", "message": "\n".join(stats), "tag": "info"})
+            
+        except Exception as e:
+            message_queue.put({"type": "console", "message": f"Error generating usage stats: {e}", "tag": "error"})
+            
     def disconnect_bot(self):
         """Disconnect the bot"""
         if messagebox.askokcancel("Disconnect Bot", 
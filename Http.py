@@ -0,0 +1,87 @@
+import asyncio
+import aiohttp
+
+# Outbound HTTP configuration
+HTTP_CONNECTION_LIMIT = 64      # Open connections across all hosts
+HTTP_LIMIT_PER_HOST = 8         # Concurrent connections to any single host
+HTTP_TIMEOUT = 15               # Seconds for a whole request
+HTTP_DNS_CACHE_TTL = 300        # Seconds resolved hosts are cached
+HTTP_USER_AGENT = "Osmium Discord Bot"
+
+
+class HttpClient:
+    """
+    Bot-lifetime HTTP client shared by every command.
+    Wraps a single aiohttp session so connections, TLS sessions and DNS lookups are reused,
+    with per-host connection caps and a default timeout.
+    """
+    def __init__(self, limit=HTTP_CONNECTION_LIMIT, limit_per_host=HTTP_LIMIT_PER_HOST,
+                 timeout=HTTP_TIMEOUT, dns_cache_ttl=HTTP_DNS_CACHE_TTL):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session = None
+
+    @property
+    def session(self):
+        """The shared session, created on first use inside the running loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": HTTP_USER_AGENT},
+            )
+        return self._session
+
+    async def get_json(self, url, **kwargs):
+        """GET a URL and return (status, parsed JSON or None)"""
+        async with self.session.get(url, **kwargs) as resp:
+            if resp.status != 200:
+                return resp.status, None
+            return resp.status, await resp.json(content_type=None)
+
+    async def get_text(self, url, **kwargs):
+        """GET a URL and return (status, body text)"""
+        async with self.session.get(url, **kwargs) as resp:
+            return resp.status, await resp.text()
+
+    async def get_bytes(self, url, **kwargs):
+        """GET a URL and return (status, body bytes)"""
+        async with self.session.get(url, **kwargs) as resp:
+            return resp.status, await resp.read()
+
+    async def get_status(self, url, **kwargs):
+        """GET a URL and return only its status code, without reading the body"""
+        async with self.session.get(url, **kwargs) as resp:
+            return resp.status
+
+    def get_bytes_threadsafe(self, url, loop, timeout=5):
+        """
+        Fetch a URL from another thread (e.g. the GUI) through the shared session running on the bot's loop.
+        Returns the body bytes, or None if the loop isn't running or the request failed.
+        """
+        if loop is None or not loop.is_running():
+            return None
+        future = asyncio.run_coroutine_threadsafe(self.get_bytes(url), loop)
+        try:
+            status, data = future.result(timeout)
+        except Exception:
+            future.cancel()
+            return None
+        return data if status == 200 else None
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# Shared client used for all outbound HTTP
+http_client = HttpClient()
@@ -0,0 +1,166 @@
+import asyncio
+import datetime
+import os
+import sys
+import threading
+import time
+
+# Loop monitor configuration
+LAG_INTERVAL = 0.25        # Seconds between heartbeats scheduled on the event loop
+LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', '0.2'))  # Stalls longer than this get recorded
+LAG_LOG_FILE = os.path.join('logs', 'loop_lag.log')
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class SlowCallback:
+    """Aggregated stalls attributed to the same activity and line of code"""
+    __slots__ = ('activity', 'location', 'count', 'total', 'worst', 'last_seen')
+
+    def __init__(self, activity, location):
+        self.activity = activity
+        self.location = location
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.last_seen = None
+
+
+class LoopMonitor:
+    """
+    Watchdog for the asyncio event loop.
+    A heartbeat on the loop measures how late it fires, while a separate thread notices when the
+    heartbeat stops and samples the loop thread's stack to find out what is blocking it.
+    """
+    def __init__(self, interval=LAG_INTERVAL, threshold=LAG_THRESHOLD, log_file=LAG_LOG_FILE):
+        self.interval = interval
+        self.threshold = threshold
+        self.log_file = log_file
+        self.lag = 0.0           # Lag of the latest heartbeat in seconds
+        self.max_lag = 0.0
+        self.offenders = {}      # (activity, location) -> SlowCallback
+        self._activities = {}    # task -> label of the command or event it is running
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = None
+        self._handle = None
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def start(self, loop=None):
+        """Start monitoring the running loop, calling it again is a no-op"""
+        if self._running:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._running = True
+        self._last_beat = time.monotonic()
+        self._schedule_beat()
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def set_activity(self, label, task=None):
+        """Label the current task so stalls it causes can be attributed to it"""
+        task = task or asyncio.current_task()
+        if task is not None:
+            self._activities[task] = label
+
+    def clear_activity(self, task=None):
+        task = task or asyncio.current_task()
+        self._activities.pop(task, None)
+
+    def worst_offenders(self, limit=5):
+        with self._lock:
+            return sorted(self.offenders.values(), key=lambda o: o.worst, reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self.offenders.clear()
+            self.max_lag = 0.0
+
+    def _schedule_beat(self):
+        expected = self._loop.time() + self.interval
+        self._handle = self._loop.call_at(expected, self._beat, expected)
+
+    def _beat(self, expected):
+        self.lag = max(0.0, self._loop.time() - expected)
+        self.max_lag = max(self.max_lag, self.lag)
+        self._last_beat = time.monotonic()
+        if self._running:
+            self._schedule_beat()
+
+    def _watch(self):
+        poll = min(self.interval, self.threshold) / 2
+        stall = None
+
+        while self._running:
+            time.sleep(poll)
+            last_beat = self._last_beat
+            behind = time.monotonic() - last_beat - self.interval
+
+            if stall is None and behind > self.threshold:
+                # The loop is stuck right now, sample what it's doing
+                activity, location = self._sample()
+                stall = (last_beat, activity, location)
+            elif stall is not None and last_beat != stall[0]:
+                # The loop came back, record how long it was gone
+                started, activity, location = stall
+                self._record(activity, location, last_beat - started - self.interval)
+                stall = None
+
+    def _sample(self):
+        task = asyncio.current_task(self._loop)
+        activity = self._activities.get(task) or (task.get_name() if task else "callback")
+
+        frame = sys._current_frames().get(self._loop_thread_id)
+        innermost = frame
+        location = "unknown"
+        while frame is not None:
+            filename = os.path.abspath(frame.f_code.co_filename)
+            if filename.startswith(PROJECT_DIR) and filename != os.path.abspath(__file__):
+                # Closest frame of our own code, plus the library call it was blocked in
+                location = _describe(frame)
+                if frame is not innermost:
+                    location += f" (blocked in {_describe(innermost)})"
+                break
+            frame = frame.f_back
+        else:
+            if innermost is not None:
+                location = _describe(innermost)
+
+        return activity, location
+
+    def _record(self, activity, location, duration):
+        with self._lock:
+            key = (activity, location)
+            offender = self.offenders.get(key)
+            if offender is None:
+                offender = self.offenders[key] = SlowCallback(activity, location)
+            offender.count += 1
+            offender.total += duration
+            offender.worst = max(offender.worst, duration)
+            offender.last_seen = datetime.datetime.now()
+
+        message = f"[LoopLag] Event loop blocked for {duration * 1000:.0f} ms by {activity} at {location}"
+        print(message)
+        try:
+            os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(f"[{datetime.datetime.now():%Y-%m-%d %H:%M:%S}] {message}\n")
+        except OSError:
+            pass
+
+
+def _describe(frame):
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+# Shared monitor, started once the bot is connected and read by the dashboard
+loop_monitor = LoopMonitor()
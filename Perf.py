@@ -0,0 +1,126 @@
+import contextvars
+import threading
+import time
+
+# Histogram bucket upper bounds in milliseconds, the last bucket catches everything slower
+BUCKET_BOUNDS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float('inf'))
+
+# Seconds spent awaiting Discord REST calls by the command currently running
+_rest_time = contextvars.ContextVar('rest_time', default=None)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, constant memory no matter how many samples it sees"""
+    __slots__ = ('counts', 'count', 'total', 'maximum')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKET_BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, ms):
+        for i, bound in enumerate(BUCKET_BOUNDS):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += ms
+        self.maximum = max(self.maximum, ms)
+
+    def percentile(self, p):
+        """Estimate a percentile (0-100) by interpolating inside the bucket that holds it"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = BUCKET_BOUNDS[i - 1] if i else 0.0
+                upper = min(BUCKET_BOUNDS[i], self.maximum)
+                fraction = (rank - seen) / bucket_count
+                return lower + (max(upper, lower) - lower) * fraction
+            seen += bucket_count
+        return self.maximum
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class CommandStats:
+    """Wall time, REST time and error counts for one command"""
+    __slots__ = ('wall', 'rest', 'errors')
+
+    def __init__(self):
+        self.wall = Histogram()
+        self.rest = Histogram()
+        self.errors = 0
+
+    @property
+    def calls(self):
+        return self.wall.count
+
+    @property
+    def error_rate(self):
+        return self.errors / self.calls if self.calls else 0.0
+
+
+class PerfRegistry:
+    """Per-command latency histograms recorded from the bot's invoke override"""
+    def __init__(self):
+        self.commands = {}
+        self.since = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, command, wall, rest=0.0, failed=False):
+        """Record one invocation, wall and rest are in seconds"""
+        with self._lock:
+            stats = self.commands.get(command)
+            if stats is None:
+                stats = self.commands[command] = CommandStats()
+            stats.wall.observe(wall * 1000)
+            stats.rest.observe(rest * 1000)
+            if failed:
+                stats.errors += 1
+
+    def reset(self, command=None):
+        """Clear every histogram, or only those of a single command"""
+        with self._lock:
+            if command is None:
+                self.commands.clear()
+                self.since = time.time()
+            else:
+                self.commands.pop(command, None)
+
+    def snapshot(self):
+        """Return (command, stats) pairs sorted by number of calls"""
+        with self._lock:
+            return sorted(self.commands.items(), key=lambda item: item[1].calls, reverse=True)
+
+
+def start_rest_timer():
+    """Start accumulating REST time for the current task (and any tasks it spawns)"""
+    accumulator = [0.0]
+    return accumulator, _rest_time.set(accumulator)
+
+
+def stop_rest_timer(token):
+    _rest_time.reset(token)
+
+
+def instrument_http(http):
+    """Wrap a discord.py HTTPClient so time spent in REST requests is charged to the running command"""
+    original_request = http.request
+
+    async def request(*args, **kwargs):
+        accumulator = _rest_time.get()
+        if accumulator is None:
+            return await original_request(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await original_request(*args, **kwargs)
+        finally:
+            accumulator[0] += time.perf_counter() - started
+
+    http.request = request
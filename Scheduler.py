@@ -0,0 +1,118 @@
+import asyncio
+import random
+import time
+
+from Dispatcher import HeapDispatcher
+
+# Enforcement pacing per guild
+MIN_INTERVAL = 15.0        # Seconds between passes right after drift was found
+MAX_INTERVAL = 600.0       # Seconds between passes once a guild has been clean for a while
+START_INTERVAL = 60.0      # Interval a guild starts at
+BACKOFF = 2.0              # Interval multiplier after a clean pass
+TIGHTEN = 4.0              # Interval divisor after a pass that found drift
+JITTER = 0.1               # Random spread as a fraction of the interval
+PASS_BUDGET = 0.05         # Seconds one guild's pass may take before it yields to the next guild
+CONTINUE_DELAY = 1.0       # Seconds before a pass that ran out of budget picks up where it stopped
+
+
+class GuildSchedule:
+    """Enforcement timing and progress of one guild"""
+    __slots__ = ('guild_id', 'interval', 'next_run', 'cursor', 'sweep_violations', 'passes', 'violations', 'last_duration')
+
+    def __init__(self, guild_id, next_run):
+        self.guild_id = guild_id
+        self.interval = START_INTERVAL
+        self.next_run = next_run
+        self.cursor = 0            # Where the check stopped, 0 once a full sweep of the guild is done
+        self.sweep_violations = 0  # Violations found so far in the current sweep
+        self.passes = 0
+        self.violations = 0
+        self.last_duration = 0.0
+
+
+class GuildScheduler:
+    """
+    Runs a periodic check for every guild on its own schedule.
+    Start times are jittered so guilds don't line up, each guild's interval backs off while it stays
+    clean and tightens after drift, and every pass gets a time budget so a large guild continues
+    where it stopped on its next pass instead of holding up the others.
+
+    check(schedule, deadline) is a coroutine function that returns the number of violations it
+    corrected, or None when the guild has nothing left to enforce and can be dropped. When it runs
+    past the deadline it leaves schedule.cursor where it stopped, and resets it to 0 once done.
+    """
+    def __init__(self, check, budget=PASS_BUDGET):
+        self.check = check
+        self.budget = budget
+        self.schedules = {}
+        self._dispatcher = HeapDispatcher(self._run, self._is_current)
+
+    def start(self, guild_ids=()):
+        """Start the dispatcher and schedule guilds at random points of their first interval"""
+        for guild_id in guild_ids:
+            self.ensure(guild_id, delay=random.uniform(0, START_INTERVAL))
+        self._dispatcher.start()
+
+    def stop(self):
+        self._dispatcher.stop()
+
+    def is_running(self):
+        return self._dispatcher.is_running()
+
+    def ensure(self, guild_id, delay=0.0):
+        """Schedule a guild if it isn't already, e.g. after its first lock was added"""
+        if guild_id not in self.schedules:
+            schedule = self.schedules[guild_id] = GuildSchedule(guild_id, time.monotonic() + delay)
+            self._push(schedule)
+
+    def report_violation(self, guild_id):
+        """Drift was found outside a pass (e.g. from an event), check the guild again sooner"""
+        schedule = self.schedules.get(guild_id)
+        if schedule is None:
+            return
+        schedule.interval = max(MIN_INTERVAL, schedule.interval / TIGHTEN)
+        next_run = time.monotonic() + _jittered(schedule.interval)
+        if next_run < schedule.next_run:
+            schedule.next_run = next_run
+            self._push(schedule)
+
+    def _push(self, schedule):
+        self._dispatcher.push(schedule.next_run, schedule.guild_id)
+
+    def _is_current(self, guild_id, next_run):
+        schedule = self.schedules.get(guild_id)
+        return schedule is not None and schedule.next_run == next_run
+
+    async def _run(self, guild_id, next_run):
+        schedule = self.schedules[guild_id]
+        started = time.monotonic()
+        try:
+            violations = await self.check(schedule, started + self.budget)
+        except Exception as e:
+            print(f"[Scheduler] Enforcement failed for guild {schedule.guild_id}: {e}")
+            violations = 0
+
+        if violations is None:
+            del self.schedules[schedule.guild_id]
+            return
+
+        schedule.passes += 1
+        schedule.violations += violations
+        schedule.sweep_violations += violations
+        schedule.last_duration = time.monotonic() - started
+        if schedule.cursor:
+            # Out of budget, finish the sweep shortly
+            schedule.next_run = time.monotonic() + CONTINUE_DELAY
+        else:
+            if schedule.sweep_violations:
+                schedule.interval = max(MIN_INTERVAL, schedule.interval / TIGHTEN)
+            else:
+                schedule.interval = min(MAX_INTERVAL, schedule.interval * BACKOFF)
+            schedule.sweep_violations = 0
+            schedule.next_run = time.monotonic() + _jittered(schedule.interval)
+        self._push(schedule)
+        await asyncio.sleep(0)  # Let other work run between guilds
+
+
+def _jittered(interval):
+    return interval * random.uniform(1 - JITTER, 1 + JITTER)
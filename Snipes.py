@@ -0,0 +1,451 @@
+import asyncio
+import concurrent.futures
+import datetime
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import time
+import zlib
+from collections import OrderedDict, deque
+
+# Snipe store configuration
+SNIPES_PER_CHANNEL = 10
+SNIPE_MEMORY_BUDGET = int(os.getenv('SNIPE_MEMORY_BUDGET', str(8 * 1024 * 1024)))  # Bytes across all channels
+RECORD_OVERHEAD = 200      # Rough bytes per record on top of its strings
+SNIPE_RING_FILE = "snipes.ring"
+SNIPE_RING_SIZE = int(os.getenv('SNIPE_RING_SIZE', str(16 * 1024 * 1024)))   # Bytes of deleted messages kept on disk
+SNIPE_RETENTION_DAYS = float(os.getenv('SNIPE_RETENTION_DAYS', '30'))        # Older snipes are no longer shown, 0 keeps them
+
+# Ring file layout: a header, then records back to back, wrapping to the start when the end is reached
+FILE_HEADER = struct.Struct('<4sHxxQQQQ')        # magic, version, size, head, tail, next seq
+FILE_MAGIC = b'OSNP'
+FILE_VERSION = 1
+DATA_START = 64
+RECORD_HEADER = struct.Struct('<HII QQ QQQ d HHI')  # magic, length, crc, seq, prev, guild, channel, author, deleted_at, name/hash/content lengths
+RECORD_MAGIC = 0x5e1f
+WRAP_MAGIC = 0x0000
+CRC_START = 10             # The crc covers everything after the magic, length and crc fields
+SEQ_FIELD = 10             # Offset of the sequence number inside a record
+CHANNEL_FIELD = 34         # Offset of the channel id inside a record
+
+# Search index configuration
+SNIPE_INDEX_FILE = "snipe_history.db"
+SNIPE_HISTORY_RETENTION_DAYS = float(os.getenv('SNIPE_HISTORY_RETENTION_DAYS', '180'))  # Older entries are pruned from search, 0 keeps them
+MAX_TERMS = 64             # Distinct words indexed per message
+_WORD = re.compile(r"\w{2,}")
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    author_name TEXT NOT NULL,
+    content TEXT NOT NULL,
+    previous TEXT,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_guild ON entries (guild_id, id);
+CREATE INDEX IF NOT EXISTS entries_author ON entries (guild_id, author_id, id);
+CREATE INDEX IF NOT EXISTS entries_channel ON entries (guild_id, channel_id, id);
+CREATE INDEX IF NOT EXISTS entries_kind ON entries (guild_id, kind, id);
+CREATE INDEX IF NOT EXISTS entries_at ON entries (at);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    entry_id INTEGER NOT NULL,
+    PRIMARY KEY (term, entry_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_entry ON postings (entry_id);
+"""
+
+
+class Snipe:
+    """One deleted message, kept as plain values so no Discord objects are pinned in memory"""
+    __slots__ = ('guild_id', 'channel_id', 'author_id', 'author_name', 'avatar_hash', 'content', 'deleted_at')
+
+    def __init__(self, guild_id, channel_id, author_id, author_name, avatar_hash, content, deleted_at):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.author_name = author_name
+        self.avatar_hash = avatar_hash
+        self.content = content
+        self.deleted_at = deleted_at   # Unix timestamp
+
+    @classmethod
+    def from_message(cls, message):
+        author = message.author
+        if getattr(author, 'discriminator', '0') != '0':
+            author_name = f"{author.name}#{author.discriminator}"
+        else:
+            author_name = author.name
+        return cls(
+            message.guild.id if message.guild else 0, message.channel.id,
+            author.id, author_name, author.avatar.key if author.avatar else None, message.content, time.time()
+        )
+
+    @property
+    def avatar_url(self):
+        if self.avatar_hash:
+            ext = "gif" if self.avatar_hash.startswith("a_") else "png"
+            return f"https://cdn.discordapp.com/avatars/{self.author_id}/{self.avatar_hash}.{ext}"
+        return f"https://cdn.discordapp.com/embed/avatars/{(self.author_id >> 22) % 6}.png"
+
+    @property
+    def time(self):
+        return datetime.datetime.fromtimestamp(self.deleted_at)
+
+    @property
+    def size(self):
+        return RECORD_OVERHEAD + len(self.content) + len(self.author_name)
+
+
+class SnipeRing:
+    """
+    Deleted messages persisted in a fixed-size memory-mapped ring file.
+    Appends overwrite the oldest records once the file is full. Every record points back to the
+    previous record of its channel, so with the newest offset per channel (rebuilt with one pass over
+    the record headers on open) a channel's latest snipes are read without touching the rest of the file.
+    """
+    def __init__(self, path=SNIPE_RING_FILE, size=SNIPE_RING_SIZE, retention_days=SNIPE_RETENTION_DAYS):
+        self.path = path
+        self.retention = retention_days * 86400
+        self.channels = {}   # channel_id -> offset of its newest record
+
+        exists = os.path.exists(path) and os.path.getsize(path) >= DATA_START
+        with open(path, 'r+b' if exists else 'w+b') as f:
+            if not exists or not self._header_matches(f):
+                # New or unrecognised file, start an empty ring (an existing ring keeps its size)
+                f.truncate(0)
+                f.truncate(size)
+                exists = False
+            self._map = mmap.mmap(f.fileno(), 0)
+        self.size = len(self._map)
+
+        if exists:
+            _, _, _, self.head, self.tail, self.seq = FILE_HEADER.unpack_from(self._map, 0)
+        else:
+            self.head, self.tail, self.seq = DATA_START, 0, 1
+            self._write_header()
+        self._expire()
+        self._rebuild_index()
+
+    def append(self, snipe):
+        name = snipe.author_name.encode('utf-8')[:0xffff]
+        avatar = (snipe.avatar_hash or '').encode('ascii')[:0xffff]
+        content = snipe.content.encode('utf-8')
+        length = RECORD_HEADER.size + len(name) + len(avatar) + len(content)
+        if length > self.size - DATA_START:
+            return
+
+        if self.head + length > self.size:
+            # Not enough room before the end, mark the gap and continue at the start
+            if self.size - self.head >= 2:
+                struct.pack_into('<H', self._map, self.head, WRAP_MAGIC)
+            # Records between the head and the end of the file are older than everything at the start,
+            # so they go first or the write below would overwrite newer records while keeping them
+            while self.tail and self.tail >= self.head:
+                self._drop_oldest()
+            self.head = DATA_START
+        self._make_room(length)
+
+        offset = self.head
+        prev = self.channels.get(snipe.channel_id, 0)
+        RECORD_HEADER.pack_into(
+            self._map, offset, RECORD_MAGIC, length, 0, self.seq, prev, snipe.guild_id, snipe.channel_id,
+            snipe.author_id, snipe.deleted_at, len(name), len(avatar), len(content)
+        )
+        body = offset + RECORD_HEADER.size
+        self._map[body:offset + length] = name + avatar + content
+        crc = zlib.crc32(self._map[offset + CRC_START:offset + length])
+        struct.pack_into('<I', self._map, offset + 6, crc)
+
+        if not self.tail:
+            self.tail = offset
+        self.channels[snipe.channel_id] = offset
+        self.head = offset + length
+        self.seq += 1
+        self._write_header()
+
+    def recent(self, channel_id, limit):
+        """Newest snipes of a channel first, following the channel's back pointers"""
+        snipes = []
+        offset = self.channels.get(channel_id, 0)
+        if not offset:
+            return snipes
+        seq = None
+        oldest = struct.unpack_from('<Q', self._map, self.tail + SEQ_FIELD)[0]
+        cutoff = time.time() - self.retention if self.retention else 0
+        while offset and len(snipes) < limit:
+            record = self._read(offset)
+            # Stop at records that were overwritten or dropped, belong elsewhere or are past retention
+            if (record is None or record[1].channel_id != channel_id or record[0] < oldest
+                    or (seq is not None and record[0] >= seq)):
+                break
+            record_seq, snipe, prev = record
+            if snipe.deleted_at < cutoff:
+                break
+            snipes.append(snipe)
+            seq, offset = record_seq, prev
+        return snipes
+
+    def __iter__(self):
+        """Every record still in the file, oldest first"""
+        offset = self.tail
+        while offset:
+            record = self._read(offset)
+            if record is None:
+                return
+            yield record[1]
+            offset = self._next(offset)
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        if not self._map.closed:
+            self._map.flush()
+            self._map.close()
+
+    def _header_matches(self, f):
+        f.seek(0)
+        data = f.read(FILE_HEADER.size)
+        return len(data) == FILE_HEADER.size and FILE_HEADER.unpack(data)[:2] == (FILE_MAGIC, FILE_VERSION)
+
+    def _write_header(self):
+        FILE_HEADER.pack_into(self._map, 0, FILE_MAGIC, FILE_VERSION, self.size, self.head, self.tail, self.seq)
+
+    def _read(self, offset):
+        """Return (seq, Snipe, prev offset) for an intact record at offset, or None"""
+        if offset < DATA_START or offset + RECORD_HEADER.size > self.size:
+            return None
+        (magic, length, crc, seq, prev, guild_id, channel_id, author_id, deleted_at,
+         name_len, avatar_len, content_len) = RECORD_HEADER.unpack_from(self._map, offset)
+        if magic != RECORD_MAGIC or length != RECORD_HEADER.size + name_len + avatar_len + content_len:
+            return None
+        if offset + length > self.size or zlib.crc32(self._map[offset + CRC_START:offset + length]) != crc:
+            return None
+        data = self._map[offset + RECORD_HEADER.size:offset + length]
+        name = data[:name_len].decode('utf-8', 'replace')
+        avatar = data[name_len:name_len + avatar_len].decode('ascii', 'replace') or None
+        content = data[name_len + avatar_len:].decode('utf-8', 'replace')
+        return seq, Snipe(guild_id, channel_id, author_id, name, avatar, content, deleted_at), prev
+
+    def _next(self, offset):
+        """Offset of the record after the one at offset, or 0 at the newest end of the ring"""
+        offset += struct.unpack_from('<I', self._map, offset + 2)[0]
+        if offset == self.head:
+            return 0
+        if offset + RECORD_HEADER.size > self.size or struct.unpack_from('<H', self._map, offset)[0] != RECORD_MAGIC:
+            offset = DATA_START
+        return 0 if offset == self.head else offset
+
+    def _drop_oldest(self):
+        channel_id = struct.unpack_from('<Q', self._map, self.tail + CHANNEL_FIELD)[0]
+        if self.channels.get(channel_id) == self.tail:
+            del self.channels[channel_id]
+        self.tail = self._next(self.tail)
+
+    def _make_room(self, length):
+        # Drop the oldest records that the next write would overlap
+        while self.tail and self.head <= self.tail < self.head + length:
+            self._drop_oldest()
+
+    def _expire(self):
+        if not self.retention:
+            return
+        cutoff = time.time() - self.retention
+        while self.tail:
+            record = self._read(self.tail)
+            if record is None or record[1].deleted_at >= cutoff:
+                break
+            self._drop_oldest()
+        self._write_header()
+
+    def _rebuild_index(self):
+        offset = self.tail
+        while offset:
+            if self._read(offset) is None:
+                # Damaged record (e.g. a crash mid-write), keep what came before it
+                self.head = offset
+                break
+            channel_id = struct.unpack_from('<Q', self._map, offset + CHANNEL_FIELD)[0]
+            self.channels[channel_id] = offset
+            offset = self._next(offset)
+        if not self.channels:
+            self.tail = 0
+        self._write_header()
+
+
+class SnipeStore:
+    """
+    Recently deleted messages, a fixed-size ring per channel in memory in front of the ring file.
+    All channels share one memory budget; once it's exceeded the channels that have gone longest
+    without a delete or a snipe are dropped first, and are read back from the file when needed.
+    """
+    def __init__(self, per_channel=SNIPES_PER_CHANNEL, budget=SNIPE_MEMORY_BUDGET, ring=None):
+        self.per_channel = per_channel
+        self.budget = budget
+        self.ring = ring
+        self.bytes = 0
+        self._channels = OrderedDict()   # channel_id -> deque of Snipe, oldest first, least recently used first
+
+    def add(self, snipe):
+        if self.ring is not None:
+            self.ring.append(snipe)
+        ring = self._channels.get(snipe.channel_id)
+        if ring is None:
+            if self.ring is not None:
+                self._load(snipe.channel_id)  # Already includes this snipe
+                return
+            ring = self._channels[snipe.channel_id] = deque(maxlen=self.per_channel)
+        else:
+            self._channels.move_to_end(snipe.channel_id)
+        if len(ring) == ring.maxlen:
+            self.bytes -= ring[0].size
+        ring.append(snipe)
+        self.bytes += snipe.size
+        self._evict()
+
+    def recent(self, channel_id, limit=SNIPES_PER_CHANNEL):
+        """Newest snipes of a channel first"""
+        ring = self._channels.get(channel_id)
+        if ring is None and self.ring is not None:
+            ring = self._load(channel_id)
+        if not ring:
+            return []
+        self._channels.move_to_end(channel_id)
+        return [ring[-i] for i in range(1, min(limit, len(ring)) + 1)]
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+
+    def _load(self, channel_id):
+        snipes = self.ring.recent(channel_id, self.per_channel)
+        if not snipes:
+            return None
+        ring = self._channels[channel_id] = deque(reversed(snipes), maxlen=self.per_channel)
+        self.bytes += sum(snipe.size for snipe in ring)
+        self._evict()
+        return ring
+
+    def __len__(self):
+        return sum(map(len, self._channels.values()))
+
+    def _evict(self):
+        while self.bytes > self.budget and self._channels:
+            channel_id, ring = next(iter(self._channels.items()))
+            if len(self._channels) == 1:
+                # A single channel over budget only loses its oldest records
+                self.bytes -= ring.popleft().size
+                if not ring:
+                    del self._channels[channel_id]
+                continue
+            del self._channels[channel_id]
+            self.bytes -= sum(snipe.size for snipe in ring)
+
+
+def index_terms(text):
+    """Distinct lowercase words of a message, as stored in the inverted index"""
+    return list(dict.fromkeys(_WORD.findall(text.lower())))[:MAX_TERMS]
+
+
+class SnipeIndex:
+    """
+    Searchable history of deleted and edited messages across every guild.
+    Entries live in SQLite next to an inverted index of their words (term -> entry ids), both
+    updated one message at a time on a worker thread. Searches filter by guild, author, channel,
+    kind and time through indexes and page backwards by entry id, so they stay fast as history grows.
+    """
+    def __init__(self, path=SNIPE_INDEX_FILE, retention_days=SNIPE_HISTORY_RETENTION_DAYS):
+        self.path = path
+        self.retention = retention_days * 86400
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="snipe-index")
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(INDEX_SCHEMA)
+        self._pruned_at = 0.0
+
+    def add(self, snipe, kind="delete", previous=None):
+        """Index a deleted message, or an edited one together with its previous content"""
+        return self._executor.submit(self._add, snipe, kind, previous)
+
+    async def search(self, guild_id, words=(), author_id=None, channel_id=None, kind=None,
+                     after=None, before=None, before_id=None, limit=5):
+        """
+        Newest matching entries first, as dicts. Every word has to appear in the message
+        (or in its content before an edit). Pass the smallest id of a page as before_id for the next one.
+        """
+        future = self._executor.submit(
+            self._search, guild_id, [w for word in words for w in index_terms(word)],
+            author_id, channel_id, kind, after, before, before_id, limit
+        )
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._db.close()
+
+    def _add(self, snipe, kind, previous):
+        if self.retention and time.time() - self._pruned_at > 86400:
+            self._prune(time.time() - self.retention)
+        try:
+            with self._db:
+                self._db.execute("BEGIN")
+                entry_id = self._db.execute(
+                    "INSERT INTO entries (kind, guild_id, channel_id, author_id, author_name, content, previous, at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (kind, snipe.guild_id, snipe.channel_id, snipe.author_id, snipe.author_name,
+                     snipe.content, previous, snipe.deleted_at)
+                ).lastrowid
+                terms = index_terms(f"{snipe.content} {previous or ''}")
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO postings (term, entry_id) VALUES (?, ?)",
+                    [(term, entry_id) for term in terms]
+                )
+        except sqlite3.Error as e:
+            print(f"[SnipeIndex] Failed to index message: {e}")
+
+    def _search(self, guild_id, terms, author_id, channel_id, kind, after, before, before_id, limit):
+        sql = ["SELECT id, kind, channel_id, author_id, author_name, content, previous, at FROM entries WHERE guild_id = ?"]
+        params = [guild_id]
+        for column, op, value in (("author_id", "=", author_id), ("channel_id", "=", channel_id), ("kind", "=", kind),
+                                  ("at", ">=", after), ("at", "<", before), ("id", "<", before_id)):
+            if value is not None:
+                sql.append(f"AND {column} {op} ?")
+                params.append(value)
+        for term in terms:
+            sql.append("AND id IN (SELECT entry_id FROM postings WHERE term = ?)")
+            params.append(term)
+        sql.append("ORDER BY id DESC LIMIT ?")
+        params.append(limit)
+
+        columns = ("id", "kind", "channel_id", "author_id", "author_name", "content", "previous", "at")
+        return [dict(zip(columns, row)) for row in self._db.execute(" ".join(sql), params)]
+
+    def _prune(self, cutoff):
+        self._pruned_at = time.time()
+        try:
+            with self._db:
+                self._db.execute("BEGIN")
+                self._db.execute("DELETE FROM postings WHERE entry_id IN (SELECT id FROM entries WHERE at < ?)", (cutoff,))
+                removed = self._db.execute("DELETE FROM entries WHERE at < ?", (cutoff,)).rowcount
+            if removed:
+                print(f"Removed {removed} snipe history entries past retention")
+        except sqlite3.Error as e:
+            print(f"[SnipeIndex] Failed to prune history: {e}")
+
+
+def open_snipe_store():
+    """Snipe store backed by the ring file, or memory only if the file can't be opened"""
+    try:
+        ring = SnipeRing()
+    except (OSError, ValueError) as e:
+        print(f"Snipe history won't survive restarts, couldn't open {SNIPE_RING_FILE}: {e}")
+        ring = None
+    return SnipeStore(ring=ring)
@@ -0,0 +1,485 @@
+import concurrent.futures
+import json
+import os
+import sqlite3
+import threading
+
+# Storage configuration
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite').lower()  # 'sqlite', or 'json' to keep the JSON files
+SNAPSHOT_INTERVAL = 60.0         # Seconds journaled changes are collected before the JSON files are rewritten
+JOURNAL_COMPACT_RECORDS = 1000   # Journal records that trigger a snapshot early
+JOURNAL_FILE = "state.journal"
+DB_FILE = os.getenv('OSMIUM_DB', 'osmium.db')
+ROLE_LOCKS_FILE = "locked_roles.json"
+CHANNEL_LOCKS_FILE = "locked_channels.json"
+STATE_FILES = {"mc_boards": "mc_boards.json"}  # State namespace -> JSON file it used to live in
+
+_DELETE = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS role_locks (
+    guild_id INTEGER NOT NULL,
+    role_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, role_id)
+);
+CREATE TABLE IF NOT EXISTS channel_locks (
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, channel_id)
+);
+CREATE TABLE IF NOT EXISTS channel_lock_users (
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, channel_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def read_json_file(path):
+    """Return the parsed contents of a JSON state file, or {} if it's missing or unreadable"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        print(f"{path} is corrupted or empty. Ignoring it.")
+        return {}
+
+
+def atomic_write(path, data):
+    """Replace a file through a temporary file, a crash leaves either the old or the new contents"""
+    temp = path + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+class JsonStorage:
+    """
+    Bot state kept in the original JSON files plus an append-only journal.
+    Every change is applied in memory and queued for the journal as one line, so persisting it
+    costs the size of the change. A journal thread appends whatever is queued and fsyncs once per
+    batch, then resolves the future each change returned, so a change is durable once its future
+    is done. Another background thread periodically writes compacted snapshots of
+    the changed files (atomically, through a temp file and os.replace) and then drops the journal
+    they cover. On startup the snapshots are loaded and the journal is replayed on top of them.
+    """
+    def __init__(self, role_file=ROLE_LOCKS_FILE, channel_file=CHANNEL_LOCKS_FILE, state_files=STATE_FILES,
+                 journal_file=JOURNAL_FILE, interval=SNAPSHOT_INTERVAL, max_journal=JOURNAL_COMPACT_RECORDS):
+        self.interval = interval
+        self.max_journal = max_journal
+        self.journal_file = journal_file
+        self.files = {"role_locks": role_file, "channel_locks": channel_file, **state_files}
+        self._data = {name: read_json_file(path) for name, path in self.files.items()}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()   # Held while the journal file is written or rotated
+        self._pending = []                      # (journal line, future) waiting for the journal thread
+        self._journal_wakeup = threading.Event()
+        self._wakeup = threading.Event()
+        self._hurry = threading.Event()
+        self._closed = False
+        self.writes = 0
+        self.journal_records = 0
+
+        replayed = self._replay(journal_file + '.old') + self._replay(journal_file)
+        if replayed:
+            print(f"Replayed {replayed} change(s) from {journal_file}")
+            self._wakeup.set()
+        self._journal = open(journal_file, 'a', encoding='utf-8')
+        if self._journal.tell() and not _ends_with_newline(journal_file):
+            self._journal.write('\n')  # Don't glue new records onto a half-written one
+
+        self._thread = threading.Thread(target=self._run, name="json-storage", daemon=True)
+        self._thread.start()
+        self._journal_thread = threading.Thread(target=self._run_journal, name="json-journal", daemon=True)
+        self._journal_thread.start()
+
+    # Loading
+
+    def load_role_locks(self):
+        """Return {guild_id: {role_id: user_id}}"""
+        with self._lock:
+            return {
+                int(gid): {int(rid): int(uid) for rid, uid in locks.items()}
+                for gid, locks in self._data["role_locks"].items()
+            }
+
+    def load_channel_locks(self):
+        """Return {guild_id: {channel_id: frozenset of allowed user ids}}"""
+        with self._lock:
+            return {
+                int(gid): {int(cid): frozenset(map(int, uids)) for cid, uids in locks.items()}
+                for gid, locks in self._data["channel_locks"].items()
+            }
+
+    def load_state(self, namespace):
+        """Return {key: value} for every entry saved under a namespace"""
+        with self._lock:
+            return json.loads(json.dumps(self._data.setdefault(namespace, {})))
+
+    # Changes, each returns a future that is done once the change is in the journal on disk
+
+    def set_role_lock(self, guild_id, role_id, user_id):
+        return self._change("role_locks", [str(guild_id), str(role_id)], str(user_id))
+
+    def delete_role_lock(self, guild_id, role_id):
+        return self._change("role_locks", [str(guild_id), str(role_id)])
+
+    def set_channel_lock(self, guild_id, channel_id, user_ids):
+        return self._change("channel_locks", [str(guild_id), str(channel_id)], sorted(map(str, user_ids)))
+
+    def delete_channel_lock(self, guild_id, channel_id):
+        return self._change("channel_locks", [str(guild_id), str(channel_id)])
+
+    def set_state(self, namespace, key, value):
+        return self._change(namespace, [str(key)], value)
+
+    def delete_state(self, namespace, key):
+        return self._change(namespace, [str(key)])
+
+    def flush(self):
+        """Snapshot every changed file, then drop the journal the snapshots cover"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            # Changes replace the dicts along their path instead of editing them, so holding on to the
+            # current roots is a consistent snapshot and serializing it can happen without the lock
+            snapshots = {name: self._data[name] for name in dirty}
+            if snapshots:
+                try:
+                    self._rotate_journal()
+                except OSError as e:
+                    print(f"[Storage] Failed to rotate {self.journal_file}: {e}")
+                    self._dirty |= dirty
+                    return
+
+        failed = False
+        for name, snapshot in snapshots.items():
+            try:
+                atomic_write(self.files[name], json.dumps(snapshot, indent=4))
+                self.writes += 1
+            except OSError as e:
+                print(f"[Storage] Failed to write {self.files[name]}: {e}")
+                failed = True
+                with self._lock:
+                    self._dirty.add(name)  # Try again on the next snapshot
+
+        if snapshots and not failed:
+            try:
+                os.remove(self.journal_file + '.old')
+            except OSError:
+                pass
+
+    def close(self):
+        """Stop the background threads once the queued changes are journaled, and write a final snapshot"""
+        self._closed = True
+        self._hurry.set()
+        self._wakeup.set()
+        self._journal_wakeup.set()
+        self._thread.join()
+        self._journal_thread.join()
+        self.flush()
+        with self._lock:
+            self._journal.close()
+
+    # Internals
+
+    def _change(self, name, keys, value=_DELETE):
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("storage is closed")
+            self.files.setdefault(name, f"{name}.json")
+            record = {"file": name, "keys": keys}
+            if value is not _DELETE:
+                record["value"] = value
+            line = json.dumps(record)
+            if value is not _DELETE:
+                value = json.loads(line)["value"]  # A private copy, so the caller can't change it under a snapshot
+            self._data[name] = _apply(self._data.get(name, {}), keys, value)
+            self._pending.append((line + '\n', future))
+            self.journal_records += 1
+            self._dirty.add(name)
+            if self.journal_records >= self.max_journal:
+                self._hurry.set()
+        self._journal_wakeup.set()
+        self._wakeup.set()
+        return future
+
+    def _replay(self, path):
+        """Apply a journal's records to the loaded snapshots, returns how many were applied"""
+        if not os.path.exists(path):
+            return 0
+        applied = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    name = record["file"]
+                    self.files.setdefault(name, f"{name}.json")
+                    self._data[name] = _apply(self._data.get(name, {}), record["keys"], record.get("value", _DELETE))
+                except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+                    # Most likely the last line of a crash mid-append, nothing after it was written
+                    print(f"Skipping unreadable journal record in {path}")
+                    continue
+                self._dirty.add(name)
+                self.journal_records += 1
+                applied += 1
+        return applied
+
+    def _rotate_journal(self):
+        """
+        Move the journal aside so changes made while snapshotting start a fresh one, lock must be held.
+        Changes still queued land in the fresh journal, after everything the old one holds, so replaying
+        both in order gives the same result.
+        """
+        with self._journal_lock:
+            self._journal.close()
+            old = self.journal_file + '.old'
+            if os.path.exists(old):
+                # A previous snapshot failed, its journal is still needed
+                with open(self.journal_file, 'r', encoding='utf-8') as src, open(old, 'a', encoding='utf-8') as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.journal_file)
+            else:
+                os.replace(self.journal_file, old)
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+        self.journal_records = 0
+
+    def _run_journal(self):
+        while True:
+            if not self._closed:
+                self._journal_wakeup.wait()
+            with self._lock:
+                self._journal_wakeup.clear()
+                batch, self._pending = self._pending, []
+                closing = self._closed
+            if not batch:
+                if closing:
+                    return
+                continue
+            # Group commit, one write and one fsync for everything queued since the last batch
+            try:
+                with self._journal_lock:
+                    self._journal.write(''.join(line for line, _ in batch))
+                    self._journal.flush()
+                    os.fsync(self._journal.fileno())
+            except (OSError, ValueError) as e:
+                print(f"[Storage] Failed to write {self.journal_file}: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for _, future in batch:
+                    future.set_result(None)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait()
+            # Let changes collect, unless the journal grew large or the storage is closing
+            self._hurry.wait(self.interval)
+            self._wakeup.clear()
+            self._hurry.clear()
+            if not self._closed:
+                self.flush()
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def _apply(data, keys, value):
+    """
+    Return data with data[k1][k2]... set to value, or deleted (dropping emptied parents) when value is _DELETE.
+    Only the dicts along the path are copied, the originals are never changed.
+    """
+    key, *rest = keys
+    data = dict(data)
+    if rest:
+        child = data.get(key)
+        if not isinstance(child, dict):
+            if value is _DELETE:
+                return data
+            child = {}
+        child = _apply(child, rest, value)
+        if child:
+            data[key] = child
+        else:
+            data.pop(key, None)
+    elif value is _DELETE:
+        data.pop(key, None)
+    else:
+        data[key] = value
+    return data
+
+
+class SqliteStorage:
+    """
+    Bot state kept in a SQLite database in WAL mode.
+    Every change is a single row upsert or delete, run on one worker thread so the event loop
+    never waits on disk and writes are applied in the order they were made.
+    Loading happens once at startup, before the loop is running.
+    """
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    # Loading
+
+    def load_role_locks(self):
+        """Return {guild_id: {role_id: user_id}}"""
+        locks = {}
+        for guild_id, role_id, user_id in self._db.execute("SELECT guild_id, role_id, user_id FROM role_locks"):
+            locks.setdefault(guild_id, {})[role_id] = user_id
+        return locks
+
+    def load_channel_locks(self):
+        """Return {guild_id: {channel_id: frozenset of allowed user ids}}"""
+        locks = {}
+        for guild_id, channel_id in self._db.execute("SELECT guild_id, channel_id FROM channel_locks"):
+            locks.setdefault(guild_id, {})[channel_id] = set()
+        for guild_id, channel_id, user_id in self._db.execute("SELECT guild_id, channel_id, user_id FROM channel_lock_users"):
+            locks.setdefault(guild_id, {}).setdefault(channel_id, set()).add(user_id)
+        return {gid: {cid: frozenset(uids) for cid, uids in channels.items()} for gid, channels in locks.items()}
+
+    def load_state(self, namespace):
+        """Return {key: value} for every entry saved under a namespace"""
+        rows = self._db.execute("SELECT key, value FROM state WHERE namespace = ?", (namespace,))
+        return {key: json.loads(value) for key, value in rows}
+
+    # Changes, each returns a future that callers may ignore
+
+    def set_role_lock(self, guild_id, role_id, user_id):
+        return self._write(
+            "INSERT INTO role_locks (guild_id, role_id, user_id) VALUES (?, ?, ?) "
+            "ON CONFLICT (guild_id, role_id) DO UPDATE SET user_id = excluded.user_id",
+            (guild_id, role_id, user_id)
+        )
+
+    def delete_role_lock(self, guild_id, role_id):
+        return self._write("DELETE FROM role_locks WHERE guild_id = ? AND role_id = ?", (guild_id, role_id))
+
+    def set_channel_lock(self, guild_id, channel_id, user_ids):
+        return self._executor.submit(self._replace_channel_lock, guild_id, channel_id, list(user_ids))
+
+    def delete_channel_lock(self, guild_id, channel_id):
+        return self._executor.submit(self._remove_channel_lock, guild_id, channel_id)
+
+    def set_state(self, namespace, key, value):
+        return self._write(
+            "INSERT INTO state (namespace, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+            (namespace, str(key), json.dumps(value))
+        )
+
+    def delete_state(self, namespace, key):
+        return self._write("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, str(key)))
+
+    def close(self):
+        """Finish pending writes and close the database"""
+        self._executor.shutdown(wait=True)
+        self._db.close()
+
+    # Migration
+
+    def migrate_json(self, role_file=ROLE_LOCKS_FILE, channel_file=CHANNEL_LOCKS_FILE, state_files=STATE_FILES):
+        """Import the old JSON state files, once. The files themselves are left untouched."""
+        if self._db.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+
+        roles = read_json_file(role_file)
+        channels = read_json_file(channel_file)
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO role_locks (guild_id, role_id, user_id) VALUES (?, ?, ?)",
+                [(int(gid), int(rid), int(uid)) for gid, locks in roles.items() for rid, uid in locks.items()]
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO channel_locks (guild_id, channel_id) VALUES (?, ?)",
+                [(int(gid), int(cid)) for gid, locks in channels.items() for cid in locks]
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO channel_lock_users (guild_id, channel_id, user_id) VALUES (?, ?, ?)",
+                [(int(gid), int(cid), int(uid)) for gid, locks in channels.items() for cid, uids in locks.items() for uid in uids]
+            )
+            for namespace, path in state_files.items():
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+                    [(namespace, str(key), json.dumps(value)) for key, value in read_json_file(path).items()]
+                )
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+        imported = sum(map(len, roles.values())) + sum(map(len, channels.values()))
+        if imported:
+            print(f"Migrated {imported} lock(s) from JSON files into {self.path}")
+
+    # Internals
+
+    def _write(self, sql, params):
+        return self._executor.submit(self._execute, sql, params)
+
+    def _execute(self, sql, params):
+        try:
+            self._db.execute(sql, params)
+        except sqlite3.Error as e:
+            print(f"[Storage] Write failed: {e}")
+            raise
+
+    def _replace_channel_lock(self, guild_id, channel_id, user_ids):
+        # The lock row is separate from its users, so a lock nobody is allowed in survives a reload
+        try:
+            with self._db:
+                self._db.execute("BEGIN")
+                self._db.execute("INSERT OR IGNORE INTO channel_locks (guild_id, channel_id) VALUES (?, ?)", (guild_id, channel_id))
+                self._db.execute("DELETE FROM channel_lock_users WHERE guild_id = ? AND channel_id = ?", (guild_id, channel_id))
+                self._db.executemany(
+                    "INSERT INTO channel_lock_users (guild_id, channel_id, user_id) VALUES (?, ?, ?)",
+                    [(guild_id, channel_id, uid) for uid in user_ids]
+                )
+        except sqlite3.Error as e:
+            print(f"[Storage] Write failed: {e}")
+            raise
+
+    def _remove_channel_lock(self, guild_id, channel_id):
+        try:
+            with self._db:
+                self._db.execute("BEGIN")
+                self._db.execute("DELETE FROM channel_locks WHERE guild_id = ? AND channel_id = ?", (guild_id, channel_id))
+                self._db.execute("DELETE FROM channel_lock_users WHERE guild_id = ? AND channel_id = ?", (guild_id, channel_id))
+        except sqlite3.Error as e:
+            print(f"[Storage] Write failed: {e}")
+            raise
+
+
+def open_storage(backend=STORAGE_BACKEND):
+    """Open the configured storage backend, SQLite imports the old JSON files on first run"""
+    if backend == 'json':
+        return JsonStorage()
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, expected 'sqlite' or 'json'")
+    storage = SqliteStorage()
+    storage.migrate_json()
+    return storage
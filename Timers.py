@@ -0,0 +1,109 @@
+import datetime
+import re
+import time
+
+from Dispatcher import HeapDispatcher
+
+MAX_SLEEP = 60.0            # Longest wait between checks, so wall clock jumps are noticed
+RETRY_DELAY = 30.0          # Seconds before a timer whose on_expire failed fires again, doubled per failure
+MAX_RETRY_DELAY = 3600.0
+MAX_DURATION = datetime.timedelta(days=3650)
+
+_DURATION_PART = re.compile(r"(\d+)\s*([smhdw])")
+_DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_duration(text):
+    """
+    Turn a duration like 30m, 2h or 1d12h into a timedelta.
+    Returns None if the text isn't a duration, or is longer than MAX_DURATION.
+    """
+    text = text.strip().lower()
+    parts = _DURATION_PART.findall(text)
+    if not parts or _DURATION_PART.sub("", text).strip():
+        return None
+    delta = datetime.timedelta()
+    try:
+        for amount, unit in parts:
+            delta += datetime.timedelta(**{_DURATION_UNITS[unit]: int(amount)})
+    except (OverflowError, ValueError):
+        return None  # Past what timedelta (or int) can hold
+    return delta if datetime.timedelta() < delta <= MAX_DURATION else None
+
+
+def looks_like_duration(text):
+    """Whether text was meant as a duration (it starts with a number), even if it doesn't parse"""
+    return text.strip()[:1].isdigit()
+
+
+class TimerHeap:
+    """
+    Persistent expirations driven by one heap and one task.
+    Every timer is a single row in storage and one heap entry, so thousands of pending timers cost
+    no sleeping tasks and survive restarts; timers that came due while the bot was offline fire on start.
+    on_expire(key, payload) is awaited for each timer as it comes due. A timer is only dropped once
+    on_expire returns, if it raises the timer fires again after a backoff.
+    """
+    def __init__(self, storage, namespace, on_expire):
+        self.storage = storage
+        self.namespace = namespace
+        self.on_expire = on_expire
+        self._entries = {}   # key -> (expires_at, payload), expires_at is a unix timestamp
+        self._failures = {}  # key -> on_expire failures in a row
+        self._dispatcher = HeapDispatcher(self._expire, self._is_current, clock=time.time, max_sleep=MAX_SLEEP)
+        for key, value in storage.load_state(namespace).items():
+            self._entries[key] = (value["at"], value["payload"])
+        self._dispatcher.rebuild((at, key) for key, (at, payload) in self._entries.items())
+
+    def schedule(self, key, expires_at, payload):
+        """Fire on_expire for key at a unix timestamp, replacing any timer already set for it"""
+        self._failures.pop(key, None)
+        self._entries[key] = (expires_at, payload)
+        self._dispatcher.push(expires_at, key)
+        self.storage.set_state(self.namespace, key, {"at": expires_at, "payload": payload})
+        self._compact()
+
+    def cancel(self, key):
+        self._failures.pop(key, None)
+        if self._entries.pop(key, None) is not None:
+            self.storage.delete_state(self.namespace, key)
+            self._compact()
+
+    def expires_at(self, key):
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def start(self):
+        self._dispatcher.start()
+
+    def stop(self):
+        self._dispatcher.stop()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _compact(self):
+        # Replaced and cancelled timers leave heap entries behind, drop them once they dominate
+        if len(self._dispatcher) > 2 * len(self._entries) + 64:
+            self._dispatcher.rebuild((at, key) for key, (at, payload) in self._entries.items())
+
+    def _is_current(self, key, expires_at):
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] == expires_at
+
+    async def _expire(self, key, expires_at):
+        entry = self._entries[key]
+        try:
+            await self.on_expire(key, entry[1])
+        except Exception as e:
+            if self._entries.get(key) is entry:
+                failures = self._failures.get(key, 0) + 1
+                delay = min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (failures - 1))
+                print(f"[Timers] Expiring {key} failed, retrying in {delay:.0f}s: {e}")
+                self.schedule(key, time.time() + delay, entry[1])
+                self._failures[key] = failures
+            else:
+                print(f"[Timers] Expiring {key} failed: {e}")
+        else:
+            if self._entries.get(key) is entry:
+                self.cancel(key)  # Unless on_expire already cancelled or rescheduled it
@@ -7,8 +7,9 @@ from dotenv import load_dotenv
 import pyjokes
 import ctypes
 import asyncio
+import time
+import re
 import nacl
-import requests
 from bs4 import BeautifulSoup
 import aiohttp
 from typing import Optional, Set
@@ -27,6 +28,19 @@ import json
 import subprocess as sp
 from discord.utils import get
 from GUI import start_gui_with_bot
+import atexit
+from CommandLog import CommandLogWriter, usage_index, parse_date_range, top_counts
+from Perf import PerfRegistry, instrument_http, start_rest_timer, stop_rest_timer
+from LoopMonitor import loop_monitor
+from Http import http_client
+from Cache import TTLCache, AsyncCache
+from ActionQueue import action_queue, PRIORITY_MODERATION, PRIORITY_ENFORCEMENT
+from Storage import open_storage
+from Scheduler import GuildScheduler
+from Timers import TimerHeap, looks_like_duration, parse_duration
+from Snipes import Snipe, SnipeIndex, open_snipe_store
+from AuditLog import AuditLogIngester
+from AntiNuke import AntiNukeEngine
 
 
 
@@ -46,6 +60,10 @@ intents.messages = True  # Make sure messages intent is enabled
 # Initialize bot with prefix and intents
 bot = commands.Bot(command_prefix=PREFIX, intents=intents)
 
+# Per-command latency histograms, REST time is measured by wrapping the bot's HTTP client
+perf = PerfRegistry()
+instrument_http(bot.http)
+
 
 reply_messages = ["Hey, what's up?", "Hello, Dave. How may I help you?", "Present!", "Yes?", "I'm always watching...", "WHO DARES SUMMON ME!?", "Hauskeeping, at your service"]
 
@@ -55,58 +73,43 @@ reply_messages = ["Hey, what's up?", "Hello, Dave. How may I help you?", "Presen
 # List of jokes for the joke command
 jokes = pyjokes.get_joke
 
-def setup_command_logging(bot):
-    @bot.event
-    async def on_command(ctx):
-        await log_command(ctx)
-    
- 
-def load_image_from_url(url, size=(40, 40)):
-    try:
-        response = requests.get(url)
-        image_data = response.content
-        img = Image.open(BytesIO(image_data)).resize(size, Image.ANTIALIAS)
-        return ImageTk.PhotoImage(img)
-    except Exception as e:
-        print(f"Image load error: {e}")
-        return None
- 
-    
-setup_command_logging(bot)
-
-# This function will be called whenever a command is invoked
-async def log_command(ctx):
-    """Log command usage to a daily log file."""
-    # Format the current date for the filename
-    today = datetime.datetime.now().strftime('%Y-%m-%d')
-    filename = f"logs_{today}.txt"
-    
-    # Get command execution time
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Extract command information
-    author = f"{ctx.author} (ID: {ctx.author.id})"
-    server = f"{ctx.guild} (ID: {ctx.guild.id})" if ctx.guild else "Direct Message"
-    channel = f"{ctx.channel} (ID: {ctx.channel.id})"
-    command = ctx.command.qualified_name
-    content = ctx.message.content
-    
-    # Format the log entry
-    log_entry = (
-        f"[{timestamp}] Command: {command}\n"
-        f"  Author:  {author}\n"
-        f"  Server:  {server}\n"
-        f"  Channel: {channel}\n"
-        f"  Content: {content}\n"
-        f"{'=' * 50}\n"
-    )
-    
-    # Create logs directory if it doesn't exist
-    os.makedirs('logs', exist_ok=True)
+# Background sink for the command log, flushed when the bot shuts down
+command_log = CommandLogWriter(index=usage_index)
+atexit.register(command_log.close)
+
+# Locks and other persistent state, changes are written on a background thread
+storage = open_storage()
+atexit.register(storage.close)
+
+# Deleted messages for the snipe command, kept on disk across restarts
+snipe_store = open_snipe_store()
+atexit.register(snipe_store.close)
+snipe_index = SnipeIndex()
+atexit.register(snipe_index.close)
+
+# Every guild's audit log, streamed into audit_log.db and to subscribers
+audit_ingester = AuditLogIngester(bot)
+atexit.register(audit_ingester.close)
+anti_nuke = AntiNukeEngine(storage)
+nuke_mitigations = set()   # Running mitigation tasks, kept referenced until they finish
+
+# This function will be called once a command has finished running
+async def log_command(ctx, latency=None, outcome="ok"):
+    """Log command usage as one JSON line in the daily log file."""
+    record = {
+        "timestamp": datetime.datetime.now().isoformat(timespec='seconds'),
+        "command": ctx.command.qualified_name,
+        "author_id": ctx.author.id,
+        "author": str(ctx.author),
+        "guild_id": ctx.guild.id if ctx.guild else None,
+        "channel_id": ctx.channel.id,
+        "content": ctx.message.content,
+        "latency_ms": round(latency * 1000, 2) if latency is not None else None,
+        "outcome": outcome,
+    }
     
-    # Write to the log file
-    with open(os.path.join('logs', filename), 'a', encoding='utf-8') as f:
-        f.write(log_entry)
+    # Hand the record to the background writer, the event loop never waits on the disk
+    command_log.write(record)
 
 
 # checked_files = set()
@@ -202,12 +205,48 @@ def hidden_command():
         return command
     return decorator
 
+def queue_role_change(member, role, add, reason=None, priority=PRIORITY_ENFORCEMENT):
+    """
+    Queue adding or removing a role through the action queue.
+    The member's current roles are checked when the action runs, so superseded or redundant changes are skipped.
+    """
+    async def apply():
+        current = member.guild.get_member(member.id) or member
+        has_role = current.get_role(role.id) is not None
+        if add and not has_role:
+            await current.add_roles(role, reason=reason)
+            print(f"Added {role.name} to {current}")
+        elif not add and has_role:
+            await current.remove_roles(role, reason=reason)
+            print(f"Removed {role.name} from {current}")
+
+    return action_queue.submit(
+        ("member_roles", member.guild.id), apply, priority,
+        key=("role", member.guild.id, member.id, role.id),
+        description=f"{'add' if add else 'remove'} {role.name} {'to' if add else 'from'} {member}"
+    )
+
+def queue_permissions(channel, target, overwrite, priority=PRIORITY_MODERATION, reason=None):
+    """Queue replacing (or with None, deleting) a permission overwrite on a channel"""
+    async def apply():
+        await channel.set_permissions(target, overwrite=overwrite, reason=reason)
+
+    return action_queue.submit(
+        ("channel", channel.id), apply, priority,
+        key=("overwrite", channel.id, target.id),
+        description=f"permissions for {target} in #{channel}"
+    )
+
 @bot.event
 async def on_ready():
     """Event triggered when the bot is ready and connected to Discord."""
     print(f'{bot.user.name} has connected to Discord!')
     print(f'Bot is in {len(bot.guilds)} guilds:')
-    enforce_locked_roles.start()
+    enforcement_scheduler.start(list(locked_roles))
+    audit_ingester.start()
+    loop_monitor.start()
+    if not mc_board_poller.is_running():
+        mc_board_poller.start()
     
     # Print detailed information about each guild the bot is in
     for i, guild in enumerate(bot.guilds):
@@ -216,22 +255,75 @@ async def on_ready():
     await bot.change_presence(activity=discord.Activity(
         type=discord.ActivityType.playing, name="A Fun Game"))
     
-    for guild in bot.guilds:
-        if guild.id in locked_channels:
-            for channel_id, user_ids in locked_channels[guild.id].items():
-                channel = guild.get_channel(channel_id)
-                if not channel:
-                    continue
+    # Restore channel locks, every channel is checked at once and only drifted ones are edited
+    restores = [
+        restore_channel_lock(guild, channel_id, user_ids)
+        for guild in bot.guilds if guild.id in locked_channels
+        for channel_id, user_ids in locked_channels[guild.id].items()
+    ]
+    if restores:
+        results = await asyncio.gather(*restores)
+        print(f"Channel locks: {results.count('restored')} restored, {results.count('ok')} already correct, "
+              f"{results.count('failed')} failed, {results.count('missing')} missing")
+
+    # Started after the restores so an expiring lock is not released while it is being restored
+    lock_timers.start()
+
+async def restore_channel_lock(guild, channel_id, user_ids):
+    """
+    Bring a locked channel's overwrites back to the locked state with a single channel edit.
+    Returns 'ok' if nothing had to change, otherwise 'restored', 'failed' or 'missing'.
+    """
+    channel = guild.get_channel(channel_id)
+    if not channel:
+        return "missing"
+    if locked_channel_overwrites(channel, user_ids) is None:
+        return "ok"
+
+    async def apply():
+        # The lock or the channel may have changed while this waited in the queue
+        if channel_id not in locked_channels.get(guild.id, {}):
+            return "ok"
+        overwrites = locked_channel_overwrites(channel, locked_channels[guild.id][channel_id])
+        if overwrites is None:
+            return "ok"
+        await channel.edit(overwrites=overwrites, reason="Restoring channel lock")
+        return "restored"
+
+    try:
+        result = await action_queue.submit(
+            ("channel", channel.id), apply, PRIORITY_ENFORCEMENT,
+            key=("channel_lock", channel.id), description=f"restore lock on #{channel.name}"
+        )
+        if result == "restored":
+            print(f"Restored lock on #{channel.name} in {guild.name}")
+        return result
+    except Exception as e:
+        print(f"Failed to restore lock on channel {channel_id}: {e}")
+        return "failed"
 
-                try:
-                    await channel.set_permissions(guild.default_role, send_messages=False)
-                    for uid in user_ids:
-                        user = guild.get_member(uid)
-                        if user:
-                            await channel.set_permissions(user, send_messages=True)
-                    print(f"Restored lock on #{channel.name} in {guild.name}")
-                except Exception as e:
-                    print(f"Failed to restore lock on channel {channel_id}: {e}")
+def locked_channel_overwrites(channel, user_ids):
+    """Return the channel's overwrites with the lock applied, or None if they already match it"""
+    guild = channel.guild
+
+    # Desired send_messages per target, anything else in the overwrites is left as it is
+    desired = {guild.default_role: False}
+    for uid in user_ids:
+        user = guild.get_member(uid)
+        if user:
+            desired[user] = True
+
+    overwrites = dict(channel.overwrites)
+    changed = False
+    for target, allow in desired.items():
+        current = overwrites.get(target, discord.PermissionOverwrite())
+        if current.send_messages is not allow:
+            updated = discord.PermissionOverwrite(**dict(current))
+            updated.send_messages = allow
+            overwrites[target] = updated
+            changed = True
+
+    return overwrites if changed else None
 
 
 
@@ -259,42 +351,48 @@ async def process_commands(self, message):
 bot.process_commands = process_commands.__get__(bot, commands.Bot)
 
 
-async def on_command(ctx):
-    """Log command usage to a daily log file."""
-    # Format the current date for the filename
-    today = datetime.datetime.now().strftime('%Y-%m-%d')
-    filename = f"logs_{today}.txt"
-    
-    # Get command execution time
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Extract command information
-    author = f"{ctx.author} (ID: {ctx.author.id})"
-    server = f"{ctx.guild} (ID: {ctx.guild.id})" if ctx.guild else "Direct Message"
-    channel = f"{ctx.channel} (ID: {ctx.channel.id})"
-    command = ctx.command.qualified_name
-    content = ctx.message.content
-    
-    # Format the log entry
-    log_entry = (
-        f"[{timestamp}] Command: {command}\n"
-        f"  Author:  {author}\n"
-        f"  Server:  {server}\n"
-        f"  Channel: {channel}\n"
-        f"  Content: {content}\n"
-        f"{'=' * 50}\n"
-    )
-    
-    # Create logs directory if it doesn't exist
-    os.makedirs('logs', exist_ok=True)
-    
-    # Write to the log file
-    with open(os.path.join('logs', filename), 'a', encoding='utf-8') as f:
-        f.write(log_entry)
+# Custom invoker that times every command and logs how it went
+async def invoke(self, ctx):
+    """
+    Override the invoke method so every command, including those run from the GUI terminal, gets logged and timed.
+    """
+    started = time.perf_counter()
+    rest_time, token = start_rest_timer()
+    if ctx.command is not None:
+        loop_monitor.set_activity(f"command {ctx.command.qualified_name}")
+    try:
+        await commands.Bot.invoke(self, ctx)
+    finally:
+        stop_rest_timer(token)
+        loop_monitor.clear_activity()
+
+    if ctx.command is not None:
+        latency = time.perf_counter() - started
+        perf.record(ctx.command.qualified_name, latency, rest_time[0], ctx.command_failed)
+        await log_command(ctx, latency, "error" if ctx.command_failed else "ok")
+
+bot.invoke = invoke.__get__(bot, commands.Bot)
+
+
+async def close(self):
+    """
+    Override the close method to flush background writers once the bot disconnects.
+    """
+    loop_monitor.stop()
+    enforcement_scheduler.stop()
+    lock_timers.stop()
+    audit_ingester.stop()
+    action_queue.stop()
+    await commands.Bot.close(self)
+    await http_client.close()
+    await asyncio.to_thread(command_log.close)
+    await asyncio.to_thread(storage.close)
+    snipe_store.close()
+    await asyncio.to_thread(snipe_index.close)
+    await asyncio.to_thread(audit_ingester.close)
+
+bot.close = close.__get__(bot, commands.Bot)
 
-# Register the event listener
-def setup_command_logging(bot):
-    bot.add_listener(on_command, 'on_command')
 
 @bot.command(name='kick')
 @is_admin()
@@ -609,93 +707,332 @@ async def ping(ctx):
     
 
     
+@bot.command(name='stats', aliases=['usage'])
+@is_admin()
+async def stats(ctx, *date_range: str):
+    """
+    Show command usage statistics from the command logs.
+    
+    Parameters:
+    - date_range: Optional number of days (e.g. 30) or one/two dates as YYYY-MM-DD (default: last 7 days)
+    """
+    try:
+        start, end = parse_date_range(date_range)
+    except ValueError:
+        await ctx.send("Invalid date range. Use a number of days or dates like `2025-04-01 2025-04-30`.")
+        return
+    
+    report = await asyncio.to_thread(usage_index.query, start, end)
+    
+    embed = discord.Embed(
+        title="Command Usage",
+        description=f"{report['total']} commands from {start} to {end} ({report['errors']} failed)",
+        color=COLOR
+    )
+    
+    commands_text = "\n".join(f"`{name}` – {count}" for name, count in top_counts(report["commands"]))
+    users_text = "\n".join(f"<@{uid}> – {count}" for uid, count in top_counts(report["users"]))
+    
+    def guild_name(gid):
+        guild = bot.get_guild(int(gid)) if gid.isdigit() else None
+        if guild:
+            return guild.name
+        return "Direct Messages" if gid == "None" else gid
+    
+    guilds_text = "\n".join(f"{guild_name(gid)} – {count}" for gid, count in top_counts(report["guilds"]))
+    hours_text = "\n".join(f"{int(hour):02d}:00 – {count}" for hour, count in top_counts(report["hours"]))
+    
+    embed.add_field(name="Top Commands", value=commands_text or "None", inline=True)
+    embed.add_field(name="Top Users", value=users_text or "None", inline=True)
+    embed.add_field(name="Top Servers", value=guilds_text or "None", inline=False)
+    embed.add_field(name="Busiest Hours", value=hours_text or "None", inline=True)
+    embed.set_footer(text=f"Requested by {ctx.author}", icon_url=ctx.author.display_avatar.url)
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='perf')
+@is_admin()
+async def perf_report(ctx, *args: str):
+    """
+    Show per-command latency percentiles since the last reset.
+    
+    Parameters:
+    - reset [command]: Clear all histograms, or only those of one command
+    - command: Only show a single command
+    """
+    if args and args[0].lower() == "reset":
+        command = " ".join(args[1:]) or None
+        perf.reset(command)
+        await ctx.send(f"Reset performance stats for `{command}`." if command else "Reset all performance stats.")
+        return
+    
+    snapshot = perf.snapshot()
+    if args:
+        snapshot = [(name, stats) for name, stats in snapshot if name == " ".join(args)]
+    
+    if not snapshot:
+        await ctx.send("No command timings recorded yet.")
+        return
+    
+    since = datetime.datetime.fromtimestamp(perf.since)
+    embed = discord.Embed(
+        title="Command Performance",
+        description=f"Wall time p50 / p95 / p99 and Discord REST p50 since {since:%Y-%m-%d %H:%M:%S}",
+        color=COLOR
+    )
+    
+    for name, stats in snapshot[:20]:  # Stay under the embed field limit
+        embed.add_field(
+            name=f"{name} ({stats.calls} calls, {stats.error_rate:.0%} errors)",
+            value=(
+                f"{stats.wall.percentile(50):.0f} / {stats.wall.percentile(95):.0f} / {stats.wall.percentile(99):.0f} ms"
+                f" · REST {stats.rest.percentile(50):.0f} ms"
+            ),
+            inline=False
+        )
+    
+    queue_stats = action_queue.stats()
+    embed.add_field(
+        name="Action Queue",
+        value=(
+            f"{queue_stats['pending']} pending (max {queue_stats['max_pending']}), {queue_stats['in_flight']} in flight · "
+            f"{queue_stats['executed']} done, {queue_stats['failed']} failed, {queue_stats['superseded']} deduplicated · "
+            f"avg wait {queue_stats['avg_wait'] * 1000:.0f} ms"
+        ),
+        inline=False
+    )
+    
+    embed.set_footer(text=f"Requested by {ctx.author}", icon_url=ctx.author.display_avatar.url)
+    await ctx.send(embed=embed)
+
+SPEEDRUN_API = "https://www.speedrun.com/api/v1"
+
+# Game ids and category lists barely change, leaderboards are refreshed in the background once stale
+speedrun_games = AsyncCache(ttl=7 * 24 * 60 * 60, negative_ttl=10 * 60, maxsize=2048)
+speedrun_categories = AsyncCache(ttl=24 * 60 * 60, stale_ttl=7 * 24 * 60 * 60, maxsize=2048)
+speedrun_leaderboards = AsyncCache(ttl=2 * 60, stale_ttl=30 * 60, maxsize=512)
+
+async def speedrun_api(path, **params):
+    """GET a speedrun.com API endpoint, returning its data or None when it doesn't exist"""
+    status, data = await http_client.get_json(f"{SPEEDRUN_API}{path}", params=params or None)
+    if status == 404:
+        return None
+    if status != 200 or data is None:
+        raise RuntimeError(f"speedrun.com returned {status}")
+    return data["data"]
+
+async def get_speedrun_game(game_name):
+    """Look up a game by name (cached long term)"""
+    async def fetch():
+        games = await speedrun_api("/games", name=game_name)
+        return games[0] if games else None
+    return await speedrun_games.get(game_name.lower(), fetch)
+
+async def get_speedrun_categories(game_id):
+    """List a game's categories (cached long term)"""
+    return await speedrun_categories.get(game_id, lambda: speedrun_api(f"/games/{game_id}/categories"))
+
+async def get_speedrun_leaderboard(game_id, category_id, top=None):
+    """Fetch the first `top` places of a category leaderboard with embedded players (short TTL, stale-while-revalidate)"""
+    top = top or SPEEDRUN_CHUNK
+    return await speedrun_leaderboards.get(
+        (game_id, category_id, top),
+        lambda: speedrun_api(f"/leaderboards/{game_id}/category/{category_id}", embed="players", top=top)
+    )
+
+SPEEDRUN_PAGE_SIZE = 5
+SPEEDRUN_CHUNK = 25          # Places fetched per request, pages beyond it are fetched lazily
+SPEEDRUN_MAX_COMPARE = 6     # Categories in one comparison
+
+def find_speedrun_category(categories, name):
+    """Match a category by name, case-insensitively"""
+    for cat in categories:
+        if cat["name"].lower() == name.lower():
+            return cat
+    return None
+
+def speedrun_run_line(entry, players_embedded):
+    """Format one leaderboard entry as (place tag, '**player** – time')"""
+    run = entry["run"]
+    time = run["times"]["primary_t"]
+    minutes, seconds = divmod(int(time), 60)
+    player_name = "Unknown"
+
+    for player in run["players"]:
+        if player["rel"] == "user":
+            player_id = player["id"]
+            user_data = players_embedded.get(player_id)
+            player_name = user_data["names"]["international"] if user_data else "Unknown"
+        elif player["rel"] == "guest":
+            player_name = player.get("name", "Guest")
+
+    place = entry.get("place")
+    place_tag = "🥇 **World Record**" if place == 1 else f"#{place}"
+    return place_tag, f"**{player_name}** – {minutes}m {seconds}s"
+
+def embedded_players(leaderboard):
+    return {p["id"]: p for p in leaderboard["players"]["data"] if p["rel"] == "user"}
+
+def build_speedrun_embed(game, category, leaderboard, page):
+    """Build the embed for one page of a leaderboard"""
+    runs = leaderboard["runs"][page * SPEEDRUN_PAGE_SIZE:(page + 1) * SPEEDRUN_PAGE_SIZE]
+    players_embedded = embedded_players(leaderboard)
+
+    first = page * SPEEDRUN_PAGE_SIZE + 1
+    embed = discord.Embed(
+        title=f"🏁 {game['names']['international']} – {category['name']} (#{first}-{first + len(runs) - 1})",
+        color=0x2a3ffa
+    )
+
+    for entry in runs:
+        place_tag, value = speedrun_run_line(entry, players_embedded)
+        embed.add_field(name=place_tag, value=value, inline=False)
+
+    embed.set_footer(text=f"Page {page + 1}")
+    return embed
+
+class SpeedrunLeaderboardView(discord.ui.View):
+    """Prev/Next buttons for a leaderboard, later pages are fetched only when someone asks for them"""
+    def __init__(self, game, category, leaderboard):
+        super().__init__(timeout=180)
+        self.game = game
+        self.category = category
+        self.leaderboard = leaderboard
+        self.fetched_top = SPEEDRUN_CHUNK
+        self.page = 0
+        self.update_buttons()
+
+    def has_more_runs(self):
+        # A chunk that came back full means there may be more places upstream
+        return len(self.leaderboard["runs"]) >= self.fetched_top
+
+    def update_buttons(self):
+        shown = (self.page + 1) * SPEEDRUN_PAGE_SIZE
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = shown >= len(self.leaderboard["runs"]) and not self.has_more_runs()
+
+    async def show_page(self, interaction: discord.Interaction, page: int):
+        needed = (page + 1) * SPEEDRUN_PAGE_SIZE
+        respond = interaction.response.edit_message
+        if needed > len(self.leaderboard["runs"]) and self.has_more_runs():
+            top = -(-needed // SPEEDRUN_CHUNK) * SPEEDRUN_CHUNK
+            await interaction.response.defer()
+            respond = interaction.edit_original_response
+            try:
+                self.leaderboard = await get_speedrun_leaderboard(self.game["id"], self.category["id"], top) or self.leaderboard
+                self.fetched_top = top
+            except Exception as e:
+                print(f"Failed to fetch more of the {self.category['name']} leaderboard: {e}")
+
+        if page * SPEEDRUN_PAGE_SIZE >= len(self.leaderboard["runs"]):
+            page = self.page  # Ran out of runs, stay where we are
+        self.page = page
+        self.update_buttons()
+        await respond(embed=build_speedrun_embed(self.game, self.category, self.leaderboard, self.page), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.primary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+
 @bot.command(name='speedrun', aliases=['srl','srlookup'])
 async def speedrun_top(ctx, *, args: str):
-    """Fetch speedrun leaderboards from speedrun.com"""
-    parts = args.split("|")
-    game_name = parts[0].strip()
-    category_name = parts[1].strip() if len(parts) > 1 else None
-
-    async with aiohttp.ClientSession() as session:
-        # Step 1: Search game
-        search_url = f"https://www.speedrun.com/api/v1/games?name={game_name}"
-        async with session.get(search_url) as resp:
-            data = await resp.json()
-            if not data["data"]:
-                await ctx.send("No game found with that name.")
-                return
-            game = data["data"][0]
-            game_id = game["id"]
+    """
+    Fetch speedrun leaderboards from speedrun.com
+    
+    Usage:
+    - ~speedrun <game>: Top runs of the main category, with buttons to page through
+    - ~speedrun <game> | <category>: A specific category
+    - ~speedrun <game> | <category> | <category> ...: Compare several categories side by side
+    """
+    parts = [part.strip() for part in args.split("|")]
+    game_name = parts[0]
+    category_names = [name for name in parts[1:] if name]
+
+    # Step 1: Search game
+    game = await get_speedrun_game(game_name)
+    if not game:
+        await ctx.send("No game found with that name.")
+        return
+    game_id = game["id"]
 
-        # Step 2: Get categories
-        cat_url = f"https://www.speedrun.com/api/v1/games/{game_id}/categories"
-        async with session.get(cat_url) as resp:
-            cat_data = await resp.json()
-            categories = cat_data["data"]
+    # Step 2: Get categories
+    categories = await get_speedrun_categories(game_id)
+    if not categories:
+        await ctx.send(f"No categories found for **{game['names']['international']}**.")
+        return
 
-        preferred_categories = ["Any%", "Early Access Any%", "100%"]
+    if len(category_names) > 1:
+        await send_speedrun_comparison(ctx, game, categories, category_names[:SPEEDRUN_MAX_COMPARE])
+        return
 
-        selected_category = None
+    preferred_categories = ["Any%", "Early Access Any%", "100%"]
 
-        if category_name:
-            for cat in categories:
-                if cat["name"].lower() == category_name.lower():
-                    selected_category = cat
-                    break
-        else:
-            for name in preferred_categories:
-                for cat in categories:
-                    if cat["name"].lower() == name.lower():
-                        selected_category = cat
-                        break
-                if selected_category:
-                    break
+    selected_category = None
 
-        if not selected_category:
-            selected_category = categories[0]
+    if category_names:
+        selected_category = find_speedrun_category(categories, category_names[0])
+    else:
+        for name in preferred_categories:
+            selected_category = find_speedrun_category(categories, name)
+            if selected_category:
+                break
 
-        category_id = selected_category["id"]
+    if not selected_category:
+        selected_category = categories[0]
 
-        # Step 3: Get leaderboard
-        lb_url = f"https://www.speedrun.com/api/v1/leaderboards/{game_id}/category/{category_id}?embed=players"
-        async with session.get(lb_url) as resp:
-            lb_data = await resp.json()
-            if "data" not in lb_data or not lb_data["data"]["runs"]:
-                await ctx.send(f"No leaderboard data found for **{selected_category['name']}**.")
-                return
+    category_id = selected_category["id"]
 
-            runs = lb_data["data"]["runs"][:5]
-            players_embedded = {
-                p["id"]: p for p in lb_data["data"]["players"]["data"] if p["rel"] == "user"
-            }
+    # Step 3: Get leaderboard
+    leaderboard = await get_speedrun_leaderboard(game_id, category_id)
+    if not leaderboard or not leaderboard["runs"]:
+        await ctx.send(f"No leaderboard data found for **{selected_category['name']}**.")
+        return
 
-            embed = discord.Embed(
-                title=f"🏁 Top 5 {game['names']['international']} – {selected_category['name']}",
-                color=0x2a3ffa
-            )
+    view = SpeedrunLeaderboardView(game, selected_category, leaderboard)
+    await ctx.send(embed=build_speedrun_embed(game, selected_category, leaderboard, 0), view=view)
+
+async def send_speedrun_comparison(ctx, game, categories, category_names):
+    """Show the top runs of several categories in one embed, fetching every leaderboard concurrently"""
+    selected = []
+    missing = []
+    for name in category_names:
+        category = find_speedrun_category(categories, name)
+        if category and category not in selected:
+            selected.append(category)
+        elif not category:
+            missing.append(name)
+
+    if not selected:
+        await ctx.send("None of those categories exist for this game.")
+        return
 
-            for i, entry in enumerate(runs, 1):
-                run = entry["run"]
-                time = run["times"]["primary_t"]
-                minutes, seconds = divmod(int(time), 60)
-                player_name = "Unknown"
-
-                for player in run["players"]:
-                    if player["rel"] == "user":
-                        player_id = player["id"]
-                        user_data = players_embedded.get(player_id)
-                        player_name = user_data["names"]["international"] if user_data else "Unknown"
-                    elif player["rel"] == "guest":
-                        player_name = player.get("name", "Guest")
-
-                place_tag = "🥇 **World Record**" if i == 1 else f"#{i}"
-                embed.add_field(
-                    name=place_tag,
-                    value=f"**{player_name}** – {minutes}m {seconds}s",
-                    inline=False
-                )
+    leaderboards = await asyncio.gather(
+        *(get_speedrun_leaderboard(game["id"], category["id"]) for category in selected),
+        return_exceptions=True
+    )
+
+    embed = discord.Embed(
+        title=f"🏁 {game['names']['international']} – Category Comparison",
+        color=0x2a3ffa
+    )
 
-            await ctx.send(embed=embed)
+    for category, leaderboard in zip(selected, leaderboards):
+        if isinstance(leaderboard, Exception) or not leaderboard or not leaderboard["runs"]:
+            embed.add_field(name=category["name"], value="No leaderboard data found.", inline=False)
+            continue
+        players_embedded = embedded_players(leaderboard)
+        lines = [" ".join(speedrun_run_line(entry, players_embedded))
+                 for entry in leaderboard["runs"][:3]]
+        embed.add_field(name=category["name"], value="\n".join(lines), inline=False)
+
+    if missing:
+        embed.set_footer(text=f"Not found: {', '.join(missing)}")
+
+    await ctx.send(embed=embed)
 
 @bot.command(name='purge', aliases=['p', 'del'])
 @is_admin()
@@ -746,8 +1083,8 @@ async def join(ctx):
 async def news(ctx):
     """stay up to date with the latest bbc news headlines"""
     url = "https://www.bbc.com/news"
-    r = requests.get(url)
-    soup = BeautifulSoup(r.text, 'html.parser')
+    _, html = await http_client.get_text(url)
+    soup = BeautifulSoup(html, 'html.parser')
     headlines = soup.find_all('h3', limit=5)
 
     news_embed = discord.Embed(
@@ -928,7 +1265,7 @@ async def give_role(ctx, member: discord.Member, *, role_name_or_id):
     
     # Assign the role
     try:
-        await member.add_roles(role, reason=f"Role granted by {ctx.author}")
+        await queue_role_change(member, role, True, reason=f"Role granted by {ctx.author}", priority=PRIORITY_MODERATION)
         
         # Create an embed for the role assignment confirmation
         embed = discord.Embed(
@@ -945,18 +1282,90 @@ async def give_role(ctx, member: discord.Member, *, role_name_or_id):
         await ctx.send(f"An error occurred: {e}")
 
 
+# Minecraft lookup caches, usernames rarely change owner while server status goes stale quickly
+mc_profile_cache = TTLCache(ttl=24 * 60 * 60, maxsize=4096)
+mc_cape_cache = TTLCache(ttl=60 * 60, maxsize=4096)
+mc_status_cache = TTLCache(ttl=30, maxsize=512)
+MC_STATUS_TIMEOUT = 10      # Seconds a server gets to answer the lookup and status ping together
+
+async def get_mc_profile(username):
+    """Return (uuid, display name) for a Minecraft username, or None if it doesn't exist"""
+    key = username.lower()
+    if key in mc_profile_cache:
+        return mc_profile_cache.get(key)
+
+    status_code, data = await http_client.get_json(f"https://api.mojang.com/users/profiles/minecraft/{username}")
+    if status_code == 200 and data:
+        profile = (data["id"], data["name"])
+        mc_profile_cache.set(key, profile)
+    elif status_code in (204, 404):
+        profile = None
+        mc_profile_cache.set(key, None, ttl=5 * 60)  # Remember misses briefly, the name may get taken
+    else:
+        raise RuntimeError(f"Mojang API returned {status_code}")
+    return profile
+
+async def has_mc_cape(uuid):
+    """Check whether a player has a cape, cached per UUID"""
+    cached = mc_cape_cache.get(uuid)
+    if cached is None:
+        cached = await http_client.get_status(f"https://crafatar.com/capes/{uuid}") == 200
+        mc_cape_cache.set(uuid, cached)
+    return cached
+
+def normalize_mc_address(address):
+    """Addresses are case insensitive, so one spelling is used for polling, caching and boards"""
+    return address.strip().lower()
+
+async def fetch_mc_server_status(address):
+    """Resolve and ping a Java server, giving up after MC_STATUS_TIMEOUT so a dead host can't stall callers"""
+    async def lookup_and_ping():
+        server = await JavaServer.async_lookup(address)
+        return await server.async_status()
+    return await asyncio.wait_for(lookup_and_ping(), timeout=MC_STATUS_TIMEOUT)
+
+async def get_mc_server_status(server_ip):
+    """Query a Java server's status without blocking the loop, failures are cached too so dead servers aren't hammered"""
+    key = normalize_mc_address(server_ip)
+    cached = mc_status_cache.get(key)
+    if cached is None:
+        try:
+            cached = await fetch_mc_server_status(key)
+        except Exception as e:
+            cached = e
+        mc_status_cache.set(key, cached, ttl=10 if isinstance(cached, Exception) else None)
+    if isinstance(cached, Exception):
+        raise cached
+    return cached
+
 @bot.command()
 async def mc(ctx, username: str, server_ip: str = None):
     """Fetch user data from a minecraft username. Alternatively, fetch a player's online status on a specified server ip"""
     try:
-        # Get UUID from Mojang
-        uuid_res = requests.get(f"https://api.mojang.com/users/profiles/minecraft/{username}")
-        if uuid_res.status_code != 200:
+        async def profile_and_cape():
+            profile = await get_mc_profile(username)
+            if profile is None:
+                return None, False
+            return profile, await has_mc_cape(profile[0])
+
+        async def online_check():
+            if not server_ip:
+                return ""
+            try:
+                status = await get_mc_server_status(server_ip)
+                sample_names = [p.name for p in status.players.sample] if status.players.sample else []
+                if username in sample_names:
+                    return f"`{username}` is online on `{server_ip}`!"
+                return f"`{username}` is NOT online on `{server_ip}`."
+            except Exception as e:
+                return f"Could not check server status:\n`{e}`"
+
+        # Mojang/crafatar and the server ping run concurrently
+        (profile, has_cape), online_status = await asyncio.gather(profile_and_cape(), online_check())
+        if profile is None:
             return await ctx.send(f"Could not find player `{username}`.")
         
-        uuid_data = uuid_res.json()
-        uuid = uuid_data["id"]
-        display_name = uuid_data["name"]
+        uuid, display_name = profile
 
         # Skin & Cape URLs
         face_url = f"https://minotar.net/helm/{uuid}/100.png"
@@ -965,23 +1374,7 @@ async def mc(ctx, username: str, server_ip: str = None):
         back_url = f"https://visage.surgeplay.com/back/100/{uuid}.png"
         cape_url = f"https://crafatar.com/capes/{uuid}"
 
-        cape_status = "No cape"
-        if requests.get(cape_url).status_code == 200:
-            cape_status = f"[View Cape]({cape_url})"
-
-        # Online status if IP given
-        online_status = ""
-        if server_ip:
-            try:
-                server = JavaServer.lookup(server_ip)
-                status = server.status()
-                sample_names = [p.name for p in status.players.sample] if status.players.sample else []
-                if username in sample_names:
-                    online_status = f"`{username}` is online on `{server_ip}`!"
-                else:
-                    online_status = f"`{username}` is NOT online on `{server_ip}`."
-            except Exception as e:
-                online_status = f"Could not check server status:\n`{e}`"
+        cape_status = f"[View Cape]({cape_url})" if has_cape else "No cape"
 
         # Create embed
         mc_embed = discord.Embed(
@@ -1003,6 +1396,265 @@ async def mc(ctx, username: str, server_ip: str = None):
     except Exception as e:
         await ctx.send(f"Unexpected error:\n`{e}`")
 
+MC_POLL_INTERVAL = 60       # Seconds between polls of the same server
+MC_POLL_JITTER = 15         # Random spread so servers don't all get polled in the same tick
+MC_POLL_CONCURRENCY = 8     # Servers pinged at the same time
+MC_BOARD_MAX_SERVERS = 25   # One embed field per server, and Discord allows 25 fields per embed
+
+# Load saved status boards
+def load_mc_boards():
+    boards = {}
+    for gid, board in storage.load_state("mc_boards").items():
+        try:
+            servers = list(dict.fromkeys(normalize_mc_address(address) for address in board.get("servers", [])))
+            boards[int(gid)] = {
+                "channel_id": int(board["channel_id"]) if board.get("channel_id") else None,
+                "message_id": int(board["message_id"]) if board.get("message_id") else None,
+                "servers": servers[:MC_BOARD_MAX_SERVERS],
+            }
+        except (KeyError, ValueError, AttributeError):
+            print(f"Minecraft board for guild {gid} is corrupted. Skipping it.")
+    return boards
+
+# Save one guild's status board, or remove it if the guild no longer has one
+def save_mc_board(guild_id):
+    board = mc_boards.get(guild_id)
+    if board is None:
+        storage.delete_state("mc_boards", guild_id)
+        return
+    storage.set_state("mc_boards", guild_id, {
+        "channel_id": str(board["channel_id"]) if board["channel_id"] else None,
+        "message_id": str(board["message_id"]) if board["message_id"] else None,
+        "servers": board["servers"],
+    })
+
+mc_boards = load_mc_boards()
+mc_server_state = {}     # address -> latest status summary
+mc_next_poll = {}        # address -> time.monotonic() of its next poll
+mc_board_rendered = {}   # guild_id -> the board content last sent to Discord
+
+async def poll_mc_server(address, semaphore):
+    """Ping one server and summarize the parts of its status shown on boards"""
+    async with semaphore:
+        try:
+            status = await fetch_mc_server_status(address)
+        except Exception as e:
+            return address, {"online": False, "error": str(e) or type(e).__name__}
+
+    mc_status_cache.set(address, status)
+    sample = sorted(p.name for p in status.players.sample) if status.players.sample else []
+    return address, {
+        "online": True,
+        "players": status.players.online,
+        "max": status.players.max,
+        "latency": int(round(status.latency / 25) * 25),  # Coarse, so ping noise alone doesn't count as a change
+        "sample": sample[:10],
+    }
+
+def render_mc_board(board):
+    """Build the board embed, returning it with a plain description used to detect changes"""
+    embed = discord.Embed(title="⛏️ Minecraft Servers", color=COLOR)
+    lines = []
+    for address in board["servers"]:
+        state = mc_server_state.get(address)
+        if state is None:
+            value = "Checking..."
+        elif state["online"]:
+            value = f"🟢 Online – {state['players']}/{state['max']} players – ~{state['latency']} ms"
+            if state["sample"]:
+                value += "\n" + ", ".join(state["sample"])
+        else:
+            value = f"🔴 Offline\n`{state['error'][:200]}`"
+        lines.append((address, value))
+        embed.add_field(name=address, value=value, inline=False)
+
+    if not lines:
+        embed.description = "No servers added yet. Use `~mcadd <address>`."
+    embed.set_footer(text="Updates automatically")
+    return embed, repr(lines)
+
+async def update_mc_board(guild_id, force=False):
+    """Edit a guild's board in place, only when its content actually changed"""
+    board = mc_boards.get(guild_id)
+    if not board or not board["message_id"]:
+        return
+
+    embed, content = render_mc_board(board)
+    if not force and mc_board_rendered.get(guild_id) == content:
+        return
+
+    channel = bot.get_channel(board["channel_id"])
+    if channel is None:
+        return
+
+    try:
+        await channel.get_partial_message(board["message_id"]).edit(embed=embed)
+        mc_board_rendered[guild_id] = content
+    except discord.NotFound:
+        # Someone deleted the board message, stop updating it until it's posted again
+        board["message_id"] = None
+        save_mc_board(guild_id)
+    except discord.HTTPException as e:
+        print(f"Failed to update Minecraft board in guild {guild_id}: {e}")
+
+@tasks.loop(seconds=5)
+async def mc_board_poller():
+    """Poll every server on any board once it is due, then refresh boards whose servers changed"""
+    now = time.monotonic()
+    addresses = {address for board in mc_boards.values() for address in board["servers"]}
+    due = [address for address in addresses if mc_next_poll.get(address, 0) <= now]
+    if not due:
+        return
+
+    semaphore = asyncio.Semaphore(MC_POLL_CONCURRENCY)
+    results = await asyncio.gather(*(poll_mc_server(address, semaphore) for address in due))
+
+    changed = set()
+    for address, state in results:
+        mc_next_poll[address] = time.monotonic() + MC_POLL_INTERVAL + random.uniform(-MC_POLL_JITTER, MC_POLL_JITTER)
+        if mc_server_state.get(address) != state:
+            mc_server_state[address] = state
+            changed.add(address)
+
+    # Forget servers no board uses anymore
+    for address in list(mc_server_state):
+        if address not in addresses:
+            mc_server_state.pop(address, None)
+            mc_next_poll.pop(address, None)
+
+    if changed:
+        await asyncio.gather(*(
+            update_mc_board(guild_id) for guild_id, board in list(mc_boards.items())
+            if changed.intersection(board["servers"])
+        ))
+
+@bot.command(name='mcboard')
+@is_admin()
+async def mc_board(ctx):
+    """Admin command to post an auto-updating Minecraft server status board in this channel"""
+    board = mc_boards.setdefault(ctx.guild.id, {"channel_id": None, "message_id": None, "servers": []})
+
+    # Move the board here if it was posted somewhere else before
+    old_channel = bot.get_channel(board["channel_id"]) if board["channel_id"] else None
+    if old_channel and board["message_id"]:
+        try:
+            await old_channel.get_partial_message(board["message_id"]).delete()
+        except discord.HTTPException:
+            pass
+
+    embed, content = render_mc_board(board)
+    message = await ctx.send(embed=embed)
+    board["channel_id"] = ctx.channel.id
+    board["message_id"] = message.id
+    mc_board_rendered[ctx.guild.id] = content
+    save_mc_board(ctx.guild.id)
+
+@bot.command(name='mcadd')
+@is_admin()
+async def mc_add(ctx, address: str):
+    """Admin command to add a Minecraft server to this server's status board"""
+    board = mc_boards.setdefault(ctx.guild.id, {"channel_id": None, "message_id": None, "servers": []})
+    address = normalize_mc_address(address)
+    if address in board["servers"]:
+        await ctx.send(f"`{address}` is already on the board.")
+        return
+    if len(board["servers"]) >= MC_BOARD_MAX_SERVERS:
+        await ctx.send(f"The board already shows {MC_BOARD_MAX_SERVERS} servers, the most Discord allows. Remove one with `~mcremove` first.")
+        return
+
+    board["servers"].append(address)
+    mc_next_poll[address] = 0  # Poll it on the next tick
+    save_mc_board(ctx.guild.id)
+    await update_mc_board(ctx.guild.id, force=True)
+    await ctx.send(f"Added `{address}` to the Minecraft board." + ("" if board["message_id"] else " Use `~mcboard` to post the board."))
+
+@bot.command(name='mcremove', aliases=['mcrm'])
+@is_admin()
+async def mc_remove(ctx, address: str):
+    """Admin command to remove a Minecraft server from this server's status board"""
+    board = mc_boards.get(ctx.guild.id)
+    address = normalize_mc_address(address)
+    if board is None or address not in board["servers"]:
+        await ctx.send(f"`{address}` is not on the board.")
+        return
+
+    board["servers"].remove(address)
+    save_mc_board(ctx.guild.id)
+    await update_mc_board(ctx.guild.id, force=True)
+    await ctx.send(f"Removed `{address}` from the Minecraft board.")
+
+@bot.command(name='mcboardstop')
+@is_admin()
+async def mc_board_stop(ctx):
+    """Admin command to delete this server's Minecraft status board"""
+    board = mc_boards.pop(ctx.guild.id, None)
+    if board is None:
+        await ctx.send("This server has no Minecraft board.")
+        return
+
+    channel = bot.get_channel(board["channel_id"]) if board["channel_id"] else None
+    if channel and board["message_id"]:
+        try:
+            await channel.get_partial_message(board["message_id"]).delete()
+        except discord.HTTPException:
+            pass
+    mc_board_rendered.pop(ctx.guild.id, None)
+    save_mc_board(ctx.guild.id)
+    await ctx.send("Removed the Minecraft board.")
+
+LOCKED_DELETE_WINDOW = 1.0   # Seconds disallowed messages are collected before one bulk delete
+BULK_DELETE_LIMIT = 100      # Messages per bulk delete request
+
+pending_locked_deletes = {}  # channel id -> messages waiting for the next bulk delete
+locked_delete_flushes = set()  # Running flush tasks, kept referenced until they finish
+
+
+def queue_locked_delete(message):
+    """Collect a disallowed message, the first one in a window schedules the channel's flush"""
+    batch = pending_locked_deletes.get(message.channel.id)
+    if batch is None:
+        batch = pending_locked_deletes[message.channel.id] = []
+        asyncio.get_running_loop().call_later(LOCKED_DELETE_WINDOW, start_locked_delete_flush, message.channel)
+    batch.append(message)
+
+def start_locked_delete_flush(channel):
+    task = asyncio.ensure_future(flush_locked_deletes(channel))
+    locked_delete_flushes.add(task)
+    task.add_done_callback(locked_delete_flush_done)
+
+def locked_delete_flush_done(task):
+    locked_delete_flushes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[LockedChannel] Bulk delete failed: {task.exception()!r}")
+
+async def flush_locked_deletes(channel):
+    """
+    Delete a channel's collected messages in bulk.
+    They were all sent within the last LOCKED_DELETE_WINDOW seconds, so Discord's 14 day limit on
+    bulk deletes never applies to them.
+    """
+    messages = pending_locked_deletes.pop(channel.id, [])
+    if not messages:
+        return
+
+    def bulk_delete(chunk):
+        async def run():
+            await channel.delete_messages(chunk, reason="Locked channel")
+        return run
+
+    chunks = [messages[i:i + BULK_DELETE_LIMIT] for i in range(0, len(messages), BULK_DELETE_LIMIT)]
+    results = await asyncio.gather(*(
+        action_queue.submit(("messages", channel.id), bulk_delete(chunk), PRIORITY_MODERATION,
+                            description=f"bulk delete in #{channel}")
+        for chunk in chunks
+    ), return_exceptions=True)
+
+    if any(isinstance(r, discord.Forbidden) for r in results):
+        print(f"Missing permissions to delete messages in #{channel}.")
+    deleted = sum(len(chunk) for chunk, result in zip(chunks, results) if not isinstance(result, Exception))
+    failed = len(messages) - deleted
+    print(f"Deleted {deleted} message(s) in locked channel #{channel}" + (f" ({failed} could not be deleted)" if failed else ""))
+
 @bot.event
 async def on_message(message):
     """Handle messages, keywords, and command processing"""
@@ -1024,20 +1676,11 @@ async def on_message(message):
     
     # Handle command prefix and deletion
     
-    guild_id = message.guild.id if message.guild else None
-    channel_id = message.channel.id if message.channel else None
-    
-    if guild_id and guild_id in locked_channels:
-        locked = locked_channels[guild_id]
-        if channel_id in locked:
-            allowed_users = locked[channel_id]
-            if message.author.id not in allowed_users:
-                try:
-                    await message.delete()
-                    print(f"Deleted message from {message.author} in locked channel #{message.channel}")
-                except discord.Forbidden:
-                    print("Missing permissions to delete message.")
-                return  # Don't process commands from blocked users
+    # Unlocked channels cost a single dict probe
+    allowed_users = locked_channel_index.get(message.channel.id)
+    if allowed_users is not None and message.author.id not in allowed_users:
+        queue_locked_delete(message)
+        return  # Don't process commands from blocked users
     
     if message.content.startswith(bot.command_prefix):
         try:
@@ -1048,23 +1691,171 @@ async def on_message(message):
     # Process commands
     await bot.process_commands(message)
 
+@audit_ingester.subscribe
+async def audit_log_monitor(guild, entry):
+    print(f"[AuditLog] {entry.action.name} by {entry.user} on {entry.target} in {guild.name}")
+
+@audit_ingester.subscribe
+async def check_anti_nuke(guild, entry):
+    """Feed every audit log entry to the anti-nuke rules, mitigating in the background so ingestion keeps up"""
+    broken = anti_nuke.observe(guild.id, entry.user_id, entry.action.name, entry.created_at.timestamp())
+    if broken:
+        task = asyncio.ensure_future(mitigate_nuke(guild, entry.user_id, entry.action.name, *broken))
+        nuke_mitigations.add(task)
+        task.add_done_callback(mitigation_done)
+
+def mitigation_done(task):
+    nuke_mitigations.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[AntiNuke] Mitigation failed: {task.exception()!r}")
+
+# Destructive actions poll the guild's audit log right away instead of waiting for its next poll
+@bot.event
+async def on_guild_channel_delete(channel):
+    if anti_nuke.enabled(channel.guild.id):
+        audit_ingester.poll_soon(channel.guild.id)
+
 @bot.event
-async def audit_log_monitor():
-    await bot.wait_until_ready()
-    last_entry_id = {}
+async def on_guild_role_delete(role):
+    if anti_nuke.enabled(role.guild.id):
+        audit_ingester.poll_soon(role.guild.id)
 
-    while not bot.is_closed():
-        for guild in bot.guilds:
+@bot.event
+async def on_member_ban(guild, user):
+    if anti_nuke.enabled(guild.id):
+        audit_ingester.poll_soon(guild.id)
+
+async def mitigate_nuke(guild, actor_id, action, count, seconds):
+    """Strip the actor's roles, time them out and alert the guild's anti-nuke channel"""
+    config = anti_nuke.config(guild.id)
+    member = guild.get_member(actor_id)
+    reason = f"Anti-nuke: more than {count} {action} in {seconds}s"
+    results = []
+
+    if member is None:
+        results.append("Actor is no longer in the server.")
+    elif member.id == guild.owner_id or member.id == bot.user.id:
+        results.append("Actor is the server owner or this bot, nothing was done.")
+    else:
+        removable = [role for role in member.roles if not role.is_default() and not role.managed and role < guild.me.top_role]
+        if removable:
             try:
-                async for entry in guild.audit_logs(limit=1):
-                    last_id = last_entry_id.get(guild.id)
-                    if last_id is None or entry.id != last_id:
-                        last_entry_id[guild.id] = entry.id
-                        print(f"[AuditLog] {entry.action.name} by {entry.user} on {entry.target}")
-            except Exception as e:
-                print(f"Audit log check failed in {guild.name}: {e}")
-        
-        await asyncio.sleep(30)
+                await action_queue.submit(
+                    ("member_roles", guild.id), lambda: member.remove_roles(*removable, reason=reason),
+                    PRIORITY_MODERATION, description=f"anti-nuke role strip of {member}"
+                )
+                results.append(f"Removed {len(removable)} role(s).")
+            except discord.HTTPException as e:
+                results.append(f"Failed to remove roles: {e}")
+        try:
+            await member.timeout(datetime.timedelta(minutes=config["timeout_minutes"]), reason=reason)
+            results.append(f"Timed out for {config['timeout_minutes']} minute(s).")
+        except discord.HTTPException as e:
+            results.append(f"Failed to time out: {e}")
+
+    print(f"[AntiNuke] {guild.name}: {actor_id} broke {action} ({count}/{seconds}s). " + " ".join(results))
+
+    channel = guild.get_channel(config["alert_channel"]) if config["alert_channel"] else guild.system_channel
+    if channel is None:
+        return
+    embed = discord.Embed(
+        title="Anti-Nuke Triggered",
+        description=f"<@{actor_id}> did more than **{count}** `{action}` in **{seconds}s**.",
+        color=discord.Color.red()
+    )
+    embed.add_field(name="Mitigation", value="\n".join(results), inline=False)
+    embed.set_footer(text=f"User ID: {actor_id}")
+    try:
+        await channel.send(embed=embed)
+    except discord.HTTPException as e:
+        print(f"[AntiNuke] Failed to alert {guild.name}: {e}")
+
+@bot.group(name='antinuke', aliases=['an'], invoke_without_command=True)
+@is_admin()
+async def antinuke(ctx):
+    """
+    Show this server's anti-nuke settings
+
+    Subcommands:
+    - ~antinuke on / off
+    - ~antinuke alert <#channel>: Where alerts are posted (default: the system channel)
+    - ~antinuke rule <action> <count> <seconds>: Act when one user does more than count actions in seconds, count 0 disables it
+    - ~antinuke timeout <minutes>: How long offenders are timed out
+    - ~antinuke trust / untrust <@user>: Users the rules never apply to
+    """
+    config = anti_nuke.config(ctx.guild.id)
+    alert = f"<#{config['alert_channel']}>" if config["alert_channel"] else "the system channel"
+    embed = discord.Embed(
+        title="Anti-Nuke",
+        description=f"**{'Enabled' if config['enabled'] else 'Disabled'}**, alerts go to {alert}. "
+                    f"Offenders lose their roles and are timed out for {config['timeout_minutes']} minute(s).",
+        color=COLOR
+    )
+    rules = [f"`{action}`: more than {count} in {seconds}s" for action, (count, seconds) in config["rules"].items() if count > 0]
+    embed.add_field(name="Rules", value="\n".join(rules) or "None", inline=False)
+    trusted = ", ".join(f"<@{uid}>" for uid in config["trusted"])
+    embed.add_field(name="Trusted", value=trusted or "Nobody", inline=False)
+    embed.set_footer(text=f"{anti_nuke.observed} audit log entries checked, {anti_nuke.triggered} triggers since start")
+    await ctx.send(embed=embed)
+
+@antinuke.command(name='on')
+@is_admin()
+async def antinuke_on(ctx):
+    anti_nuke.update(ctx.guild.id, enabled=True)
+    await ctx.send("Anti-nuke is now **enabled**.")
+
+@antinuke.command(name='off')
+@is_admin()
+async def antinuke_off(ctx):
+    anti_nuke.update(ctx.guild.id, enabled=False)
+    await ctx.send("Anti-nuke is now **disabled**.")
+
+@antinuke.command(name='alert')
+@is_admin()
+async def antinuke_alert(ctx, channel: discord.TextChannel):
+    anti_nuke.update(ctx.guild.id, alert_channel=channel.id)
+    await ctx.send(f"Anti-nuke alerts will be posted in {channel.mention}.")
+
+@antinuke.command(name='rule')
+@is_admin()
+async def antinuke_rule(ctx, action: str, count: int, seconds: int):
+    action = action.lower()
+    if action not in discord.AuditLogAction.__members__:
+        await ctx.send(f"`{action}` isn't an audit log action (e.g. `channel_delete`, `ban`, `kick`, `role_delete`).")
+        return
+    if count < 0 or seconds <= 0:
+        await ctx.send("Count can't be negative and seconds must be positive.")
+        return
+    rules = anti_nuke.config(ctx.guild.id)["rules"]
+    rules[action] = [count, seconds]
+    anti_nuke.update(ctx.guild.id, rules=rules)
+    if count:
+        await ctx.send(f"Anti-nuke will act on more than {count} `{action}` by one user in {seconds}s.")
+    else:
+        await ctx.send(f"Disabled the `{action}` rule.")
+
+@antinuke.command(name='timeout')
+@is_admin()
+async def antinuke_timeout(ctx, minutes: int):
+    minutes = max(1, min(minutes, 40320))  # Discord allows up to 28 days
+    anti_nuke.update(ctx.guild.id, timeout_minutes=minutes)
+    await ctx.send(f"Offenders will be timed out for {minutes} minute(s).")
+
+@antinuke.command(name='trust')
+@is_admin()
+async def antinuke_trust(ctx, user: discord.Member):
+    trusted = anti_nuke.config(ctx.guild.id)["trusted"]
+    if user.id not in trusted:
+        trusted.append(user.id)
+    anti_nuke.update(ctx.guild.id, trusted=trusted)
+    await ctx.send(f"Anti-nuke rules no longer apply to {user.mention}.")
+
+@antinuke.command(name='untrust')
+@is_admin()
+async def antinuke_untrust(ctx, user: discord.Member):
+    trusted = [uid for uid in anti_nuke.config(ctx.guild.id)["trusted"] if uid != user.id]
+    anti_nuke.update(ctx.guild.id, trusted=trusted)
+    await ctx.send(f"Anti-nuke rules apply to {user.mention} again.")
 
 @bot.event
 async def on_member_join(member):
@@ -1072,7 +1863,12 @@ async def on_member_join(member):
     guild = member.guild
     role = discord.utils.get(guild.roles, name=role_name)
 
-    if role:
+    # Give back any role that is locked to this user
+    await enforce_member_roles(member)
+
+    if role and locked_roles.get(guild.id, {}).get(role.id, member.id) != member.id:
+        msg = f"Not assigning **{role.name}** to {member.mention}, it is locked to another user"
+    elif role:
         await member.add_roles(role)
         msg = f"Assigned **{role.name}** to {member.mention}"
     else:
@@ -1191,8 +1987,6 @@ async def dashboard(ctx, member: discord.Member):
 
 
 
-sniped_messages = {}  # Format: {channel_id: [(content, author, time), ...]}
-
 @bot.event
 async def on_message_delete(message):
     """Store deleted messages for the snipe command, excluding tilde commands"""
@@ -1208,20 +2002,20 @@ async def on_message_delete(message):
     if not message.content:
         return
         
-    channel_id = message.channel.id
-    
-    # Initialize the list for this channel if it doesn't exist
-    if channel_id not in sniped_messages:
-        sniped_messages[channel_id] = []
-    
-    # Add the message to the list (up to 10 messages per channel)
-    sniped_messages[channel_id].insert(0, (message.content, message.author, datetime.datetime.now()))
-    
-    # Keep only the 10 most recent messages
-    if len(sniped_messages[channel_id]) > 10:
-        sniped_messages[channel_id].pop()
+    # Keep it in the channel's ring of recent deletes (up to 10 messages per channel)
+    deleted = Snipe.from_message(message)
+    snipe_store.add(deleted)
+    if message.guild:
+        snipe_index.add(deleted)
+
+@bot.event
+async def on_message_edit(before, after):
+    """Record edits in the searchable snipe history"""
+    if after.author.bot or not after.guild or before.content == after.content:
+        return
+    snipe_index.add(Snipe.from_message(after), "edit", previous=before.content)
     
-@bot.command(name='snipe', aliases=['wb','grab','history'])
+@bot.group(name='snipe', aliases=['wb','grab','history'], invoke_without_command=True)
 @is_admin()
 async def snipe(ctx, num: int = 1):
     """
@@ -1230,33 +2024,25 @@ async def snipe(ctx, num: int = 1):
     Parameters:
     - num: Optional number of messages to show (default: 1, max: 5)
     """
-    channel_id = ctx.channel.id
-    
+    # Limit the number of messages to show
+    snipes = snipe_store.recent(ctx.channel.id, min(num, 10))
+
     # Check if there are any sniped messages for this channel
-    if channel_id not in sniped_messages or not sniped_messages[channel_id]:
+    if not snipes:
         await ctx.send("There are no recently deleted messages in this channel!")
         return
-    
-    # Limit the number of messages to show
-    num = min(num, 10)  # Maximum of 5 messages at once
-    num = min(num, len(sniped_messages[channel_id]))  # Can't show more than we have
+    num = len(snipes)  # Can't show more than we have
     
     if num == 1:
         # Single message display
-        content, author, time = sniped_messages[channel_id][0]
+        deleted = snipes[0]
         
         embed = discord.Embed(
-            description=content,
+            description=deleted.content,
             color=0x2a3ffa,
-            timestamp=time
+            timestamp=deleted.time
         )
-        # Fix the author display - handle potential discriminator issues
-        if hasattr(author, 'discriminator') and author.discriminator != '0':
-            author_name = f"{author.name}#{author.discriminator}"
-        else:
-            author_name = author.name
-            
-        embed.set_author(name=author_name, icon_url=author.display_avatar.url)
+        embed.set_author(name=deleted.author_name, icon_url=deleted.avatar_url)
         embed.set_footer(text=f"Deleted at")
         
         await ctx.send(embed=embed)
@@ -1267,25 +2053,16 @@ async def snipe(ctx, num: int = 1):
             color=0x2a3ffa
         )
         
-        for i in range(num):
-            if i >= len(sniped_messages[channel_id]):
-                break
-                
-            content, author, time = sniped_messages[channel_id][i]
-            time_str = time.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Handle potential discriminator issues
-            if hasattr(author, 'discriminator') and author.discriminator != '0':
-                author_name = f"{author.name}#{author.discriminator}"
-            else:
-                author_name = author.name
+        for i, deleted in enumerate(snipes):
+            content = deleted.content
+            time_str = deleted.time.strftime("%Y-%m-%d %H:%M:%S")
             
             # Truncate content if too long
             if len(content) > 1024:
                 content = content[:1021] + "..."
                 
             embed.add_field(
-                name=f"{i+1}. {author_name} at {time_str}",
+                name=f"{i+1}. {deleted.author_name} at {time_str}",
                 value=content,
                 inline=False
             )
@@ -1294,28 +2071,138 @@ async def snipe(ctx, num: int = 1):
         
         await ctx.send(embed=embed)
     
-DATA_FILE = "locked_roles.json"
+SNIPE_SEARCH_PAGE_SIZE = 5
 
-# Load saved locked roles from file
-def load_locked_roles():
-    if not os.path.exists(DATA_FILE) or os.path.getsize(DATA_FILE) == 0:
-        return {}
-    with open(DATA_FILE, "r") as f:
-        try:
-            return {
-                int(gid): {int(rid): int(uid) for rid, uid in roles.items()}
-                for gid, roles in json.load(f).items()
-            }
-        except json.JSONDecodeError:
-            print("locked_roles.json is corrupted or empty. Resetting.")
-            return {}
+def parse_snipe_query(args):
+    """
+    Split snipe search arguments into filters and keywords.
+    Raises ValueError with a message for the user when a filter can't be understood.
+    """
+    filters = {"words": []}
+    for arg in args:
+        key, _, value = arg.partition(":") if ":" in arg and not arg.startswith("<") else ("", "", arg)
+        key = key.lower()
+        mention = re.fullmatch(r"<(@!?|#)(\d+)>|(\d{15,20})", value)
+
+        if key in ("from", "author", "user") or (not key and mention and mention.group(1) and mention.group(1) != "#"):
+            if not mention:
+                raise ValueError(f"`{arg}` isn't a user mention or ID.")
+            filters["author_id"] = int(mention.group(2) or mention.group(3))
+        elif key in ("in", "channel") or (not key and mention and mention.group(1) == "#"):
+            if not mention:
+                raise ValueError(f"`{arg}` isn't a channel mention or ID.")
+            filters["channel_id"] = int(mention.group(2) or mention.group(3))
+        elif key in ("after", "before", "since"):
+            filters["before" if key == "before" else "after"] = parse_snipe_time(value)
+        elif key == "type":
+            kind = {"edit": "edit", "edited": "edit", "edits": "edit", "delete": "delete", "deleted": "delete", "deletes": "delete"}.get(value.lower())
+            if kind is None:
+                raise ValueError("Type must be `edit` or `delete`.")
+            filters["kind"] = kind
+        else:
+            filters["words"].append(arg)
+    return filters
+
+def parse_snipe_time(value):
+    """A date (YYYY-MM-DD) or how long ago (e.g. 7d, 12h) as a unix timestamp"""
+    delta = parse_duration(value)
+    if delta is not None:
+        return time.time() - delta.total_seconds()
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"`{value}` isn't a date (YYYY-MM-DD) or a duration like `7d`.")
+
+def build_snipe_search_embed(results, page, has_more):
+    embed = discord.Embed(title="Snipe Search", color=COLOR)
+    if not results:
+        embed.description = "No deleted or edited messages match that search."
+        return embed
+
+    for entry in results:
+        content = entry["content"] or "*empty*"
+        if entry["kind"] == "edit":
+            content = f"**Before:** {entry['previous'] or '*empty*'}\n**After:** {content}"
+        if len(content) > 1024:
+            content = content[:1021] + "..."
+        action = "edited" if entry["kind"] == "edit" else "deleted"
+        embed.add_field(
+            name=f"{entry['author_name']} · {action}",
+            value=f"<#{entry['channel_id']}> <t:{int(entry['at'])}:R>\n{content}"[:1024],
+            inline=False
+        )
+    embed.set_footer(text=f"Page {page + 1}" + ("" if has_more else " (last)"))
+    return embed
+
+class SnipeSearchView(discord.ui.View):
+    """Prev/Next buttons for snipe search results, each page is queried only when it's first shown"""
+    def __init__(self, guild_id, filters, first_page):
+        super().__init__(timeout=300)
+        self.guild_id = guild_id
+        self.filters = filters
+        self.pages = [first_page[:SNIPE_SEARCH_PAGE_SIZE]]
+        self.has_more = len(first_page) > SNIPE_SEARCH_PAGE_SIZE
+        self.page = 0
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = self.page == len(self.pages) - 1 and not self.has_more
+
+    def current_embed(self):
+        last = self.page == len(self.pages) - 1 and not self.has_more
+        return build_snipe_search_embed(self.pages[self.page], self.page, not last)
+
+    async def show_page(self, interaction: discord.Interaction, page: int):
+        if page == len(self.pages):
+            # Continue below the oldest entry shown so far
+            results = await snipe_index.search(
+                self.guild_id, before_id=self.pages[-1][-1]["id"], limit=SNIPE_SEARCH_PAGE_SIZE + 1, **self.filters
+            )
+            self.has_more = len(results) > SNIPE_SEARCH_PAGE_SIZE
+            if results:
+                self.pages.append(results[:SNIPE_SEARCH_PAGE_SIZE])
+            else:
+                page = self.page
+        self.page = page
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.current_embed(), view=self)
 
-# Save locked roles to file
-def save_locked_roles():
-    with open(DATA_FILE, "w") as f:
-        json.dump({str(gid): {str(rid): str(uid) for rid, uid in roles.items()} for gid, roles in locked_roles.items()}, f, indent=4)
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, max(0, self.page - 1))
 
-locked_roles = load_locked_roles()
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.primary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+
+@snipe.command(name='search', aliases=['find'])
+@is_admin()
+async def snipe_search(ctx, *args):
+    """
+    Search deleted and edited messages across the whole server
+
+    Filters (all optional, combine freely):
+    - from:@user or a user mention
+    - in:#channel or a channel mention
+    - after:/before: a date (YYYY-MM-DD) or how long ago (e.g. 7d, 12h)
+    - type:edit or type:delete
+    Any other words must all appear in the message.
+    """
+    try:
+        filters = parse_snipe_query(args)
+    except ValueError as e:
+        await ctx.send(str(e))
+        return
+
+    results = await snipe_index.search(ctx.guild.id, limit=SNIPE_SEARCH_PAGE_SIZE + 1, **filters)
+    if not results:
+        await ctx.send(embed=build_snipe_search_embed([], 0, False))
+        return
+    view = SnipeSearchView(ctx.guild.id, filters, results)
+    await ctx.send(embed=view.current_embed(), view=view)
+
+locked_roles = storage.load_role_locks()
 
 def is_admin():
     async def predicate(ctx):
@@ -1325,21 +2212,28 @@ def is_admin():
 
 @bot.command(name="lockrole",aliases=['lr'])
 @is_admin()
-async def lockrole(ctx, role: discord.Role, user: discord.Member):
+async def lockrole(ctx, role: discord.Role, user: discord.Member, duration: Optional[str] = None):
+    """Admin command to lock a role to one user, optionally only for a while (e.g. 30m, 2h, 1d)."""
+    expires_at = None
+    if duration is not None:
+        delta = parse_duration(duration)
+        if delta is None:
+            await ctx.send("Invalid duration. Use something like `30m`, `2h` or `1d12h`, up to 10 years.")
+            return
+        expires_at = time.time() + delta.total_seconds()
+
     guild_locks = locked_roles.setdefault(ctx.guild.id, {})
     guild_locks[role.id] = user.id
-    save_locked_roles()
-    await ctx.send(f"Locked role **{role.name}** to {user.mention}.")
+    storage.set_role_lock(ctx.guild.id, role.id, user.id)
+    set_lock_expiry("role", ctx.guild.id, role.id, expires_at)
+    await ctx.send(f"Locked role **{role.name}** to {user.mention}" + (f" until <t:{int(expires_at)}:f>." if expires_at else "."))
+    await enforce_role_lock(ctx.guild, role.id, user.id)
+    enforcement_scheduler.ensure(ctx.guild.id)
 
 @bot.command(name="unlockrole",aliases=['ulr'])
 @is_admin()
 async def unlockrole(ctx, role: discord.Role):
-    guild_locks = locked_roles.get(ctx.guild.id, {})
-    if role.id in guild_locks:
-        del guild_locks[role.id]
-        if not guild_locks:
-            locked_roles.pop(ctx.guild.id)
-        save_locked_roles()
+    if release_role_lock(ctx.guild.id, role.id):
         await ctx.send(f"Unlocked role **{role.name}**.")
     else:
         await ctx.send(f"Role **{role.name}** is not currently locked.")
@@ -1357,51 +2251,108 @@ async def lockedroles_cmd(ctx):
         role = ctx.guild.get_role(role_id)
         user = ctx.guild.get_member(user_id)
         if role and user:
-            embed.add_field(name=role.name, value=f"Locked to {user.mention}", inline=False)
+            expires_at = lock_timers.expires_at(lock_timer_key("role", ctx.guild.id, role_id))
+            expiry = f" until <t:{int(expires_at)}:R>" if expires_at else ""
+            embed.add_field(name=role.name, value=f"Locked to {user.mention}{expiry}", inline=False)
     await ctx.send(embed=embed)
 
-@tasks.loop(seconds=10)
-async def enforce_locked_roles():
-    for guild in bot.guilds:
-        guild_locks = locked_roles.get(guild.id, {})
-        for role_id, allowed_user_id in guild_locks.items():
-            role = guild.get_role(role_id)
-            user = guild.get_member(allowed_user_id)
-            if role is None:
-                continue
-
-            # Grant role if user doesn't have it
-            if user and role not in user.roles:
-                try:
-                    await user.add_roles(role, reason="Role locked to this user.")
-                    print(f"Added {role.name} to {user}")
-                except Exception as e:
-                    print(f"Error granting role {role.name} to {user}: {e}")
-
-            # Remove role from others
-            for member in role.members:
-                if member.id != allowed_user_id:
-                    try:
-                        await member.remove_roles(role, reason="Role locked to another user.")
-                        print(f"Removed {role.name} from {member}")
-                    except Exception as e:
-                        print(f"Error removing {role.name} from {member}: {e}")
-
-
-CHANNEL_LOCKS_FILE = "locked_channels.json"
-
-
-def load_channel_locks():
-    if not os.path.exists(CHANNEL_LOCKS_FILE):
-        return {}
-    with open(CHANNEL_LOCKS_FILE, "r") as f:
-        return {int(gid): {int(cid): list(map(int, uids)) for cid, uids in channels.items()} for gid, channels in json.load(f).items()}
-
-def save_channel_locks():
-    with open(CHANNEL_LOCKS_FILE, "w") as f:
-        json.dump({str(gid): {str(cid): list(map(str, uids)) for cid, uids in channels.items()} for gid, channels in locked_channels.items()}, f, indent=4)
-
-locked_channels = load_channel_locks()
+def release_role_lock(guild_id, role_id):
+    """Forget a role lock and its expiry, returns False if the role wasn't locked"""
+    guild_locks = locked_roles.get(guild_id, {})
+    if role_id not in guild_locks:
+        return False
+    del guild_locks[role_id]
+    if not guild_locks:
+        locked_roles.pop(guild_id)
+    storage.delete_role_lock(guild_id, role_id)
+    set_lock_expiry("role", guild_id, role_id, None)
+    return True
+
+async def enforce_role_lock(guild, role_id, allowed_user_id):
+    """Make sure a locked role is held by its user and nobody else, returns how many corrections were queued"""
+    role = guild.get_role(role_id)
+    user = guild.get_member(allowed_user_id)
+    if role is None:
+        return 0
+    corrections = 0
+
+    # Grant role if user doesn't have it
+    if user and role not in user.roles:
+        queue_role_change(user, role, True, reason="Role locked to this user.")
+        corrections += 1
+
+    # Remove role from others
+    for member in role.members:
+        if member.id != allowed_user_id:
+            queue_role_change(member, role, False, reason="Role locked to another user.")
+            corrections += 1
+    return corrections
+
+async def enforce_member_roles(member, changed_role_ids=None):
+    """Correct one member's locked roles, optionally only the roles that just changed, returns how many were corrected"""
+    guild_locks = locked_roles.get(member.guild.id)
+    if not guild_locks:
+        return 0
+
+    role_ids = guild_locks.keys() if changed_role_ids is None else changed_role_ids & guild_locks.keys()
+    member_role_ids = {role.id for role in member.roles}
+    corrections = 0
+    for role_id in role_ids:
+        role = member.guild.get_role(role_id)
+        if role is None:
+            continue
+        allowed_user_id = guild_locks[role_id]
+        if member.id == allowed_user_id and role_id not in member_role_ids:
+            queue_role_change(member, role, True, reason="Role locked to this user.")
+            corrections += 1
+        elif member.id != allowed_user_id and role_id in member_role_ids:
+            queue_role_change(member, role, False, reason="Role locked to another user.")
+            corrections += 1
+    return corrections
+
+@bot.event
+async def on_member_update(before, after):
+    """Correct locked roles as soon as someone's roles change"""
+    if before.roles == after.roles or after.guild.id not in locked_roles:
+        return
+    changed = {role.id for role in before.roles} ^ {role.id for role in after.roles}
+    if await enforce_member_roles(after, changed):
+        # Someone is fighting the lock, sweep the guild sooner
+        enforcement_scheduler.report_violation(after.guild.id)
+
+async def enforce_guild_locks(schedule, deadline):
+    """
+    Safety net for missed events (e.g. while disconnected), run per guild by the enforcement scheduler.
+    Role changes are corrected from on_member_update, this sweeps a guild's locks until the pass runs out of time.
+    """
+    guild = bot.get_guild(schedule.guild_id)
+    guild_locks = locked_roles.get(schedule.guild_id)
+    if guild is None or not guild_locks:
+        return None
+
+    locks = list(guild_locks.items())
+    if schedule.cursor >= len(locks):
+        schedule.cursor = 0
+    corrections = 0
+    for i in range(schedule.cursor, len(locks)):
+        corrections += await enforce_role_lock(guild, *locks[i])
+        if time.monotonic() >= deadline and i + 1 < len(locks):
+            schedule.cursor = i + 1
+            return corrections
+    schedule.cursor = 0
+    return corrections
+
+enforcement_scheduler = GuildScheduler(enforce_guild_locks)
+
+
+def rebuild_channel_lock_index():
+    """Flatten locked_channels into channel id -> allowed user ids, call after every change to it"""
+    global locked_channel_index
+    locked_channel_index = {cid: uids for channels in locked_channels.values() for cid, uids in channels.items()}
+
+locked_channels = storage.load_channel_locks()
+locked_channel_index = {}  # channel id -> frozenset of allowed user ids, only locked channels are present
+rebuild_channel_lock_index()
 
 def is_admin():
     async def predicate(ctx):
@@ -1411,8 +2362,8 @@ def is_admin():
 
 @bot.command(name="lockchannel",aliases=['lock','lc','oppress'])
 @is_admin()
-async def lockchannel(ctx, *allowed: discord.Member):
-    """Admin command to only allow certain users to speak in a channel quickly."""
+async def lockchannel(ctx, allowed: commands.Greedy[discord.Member], duration: Optional[str] = None):
+    """Admin command to only allow certain users to speak in a channel quickly, optionally only for a while (e.g. 30m)."""
     channel = ctx.channel
     guild_id = ctx.guild.id
     channel_id = channel.id
@@ -1421,46 +2372,96 @@ async def lockchannel(ctx, *allowed: discord.Member):
         await ctx.send("You must mention at least one user to allow.")
         return
 
+    expires_at = None
+    if duration is not None:
+        delta = parse_duration(duration)
+        if delta is None and not looks_like_duration(duration):
+            # Greedy stops at the first word that isn't a member, so this is a name that didn't match
+            await ctx.send("Member not found.")
+            return
+        if delta is None:
+            await ctx.send("Invalid duration. Use something like `30m`, `2h` or `1d12h`, up to 10 years.")
+            return
+        expires_at = time.time() + delta.total_seconds()
+
     # Save allowed users
-    locked_channels.setdefault(guild_id, {})[channel_id] = [u.id for u in allowed]
+    locked_channels.setdefault(guild_id, {})[channel_id] = frozenset(u.id for u in allowed)
+    rebuild_channel_lock_index()
 
     # Update channel permissions
     overwrite = discord.PermissionOverwrite(send_messages=False)
-    await channel.set_permissions(ctx.guild.default_role, overwrite=overwrite)
+    changes = [queue_permissions(channel, ctx.guild.default_role, overwrite)]
 
     for user in allowed:
-        await channel.set_permissions(user, send_messages=True)
+        changes.append(queue_permissions(channel, user, discord.PermissionOverwrite(send_messages=True)))
+    await asyncio.gather(*changes)
 
-    save_channel_locks()
-    await ctx.send(f"Locked {channel.mention}. Only {', '.join(u.mention for u in allowed)} can speak here.")
+    storage.set_channel_lock(guild_id, channel_id, locked_channels[guild_id][channel_id])
+    set_lock_expiry("channel", guild_id, channel_id, expires_at)
+    until = f" until <t:{int(expires_at)}:f>" if expires_at else ""
+    await ctx.send(f"Locked {channel.mention}{until}. Only {', '.join(u.mention for u in allowed)} can speak here.")
 
 
 @bot.command(name="unlockchannel",aliases=['ulc','unlock','unoppress'])
 @is_admin()
 async def unlockchannel(ctx):
     """Unlocks a locked channel."""
-    channel = ctx.channel
-    guild_id = ctx.guild.id
-    channel_id = channel.id
+    if await release_channel_lock(ctx.guild, ctx.guild.id, ctx.channel.id):
+        await ctx.send(f"Unlocked {ctx.channel.mention}. Everyone can talk now.")
+    else:
+        await ctx.send("This channel is not currently locked.")
+
 
-    if guild_id in locked_channels and channel_id in locked_channels[guild_id]:
-        allowed_ids = locked_channels[guild_id][channel_id]
+async def release_channel_lock(guild, guild_id, channel_id):
+    """Reset a locked channel's permissions and forget the lock, returns False if it wasn't locked"""
+    if channel_id not in locked_channels.get(guild_id, {}):
+        return False
+    allowed_ids = locked_channels[guild_id][channel_id]
 
-        # Reset permissions
-        await channel.set_permissions(ctx.guild.default_role, overwrite=None)
+    # Reset permissions, unless the channel or the whole guild is gone
+    channel = guild.get_channel(channel_id) if guild else None
+    if channel:
+        changes = [queue_permissions(channel, guild.default_role, None)]
         for uid in allowed_ids:
-            user = ctx.guild.get_member(uid)
+            user = guild.get_member(uid)
             if user:
-                await channel.set_permissions(user, overwrite=None)
+                changes.append(queue_permissions(channel, user, None))
+        await asyncio.gather(*changes)
+
+    del locked_channels[guild_id][channel_id]
+    if not locked_channels[guild_id]:
+        del locked_channels[guild_id]
+    rebuild_channel_lock_index()
+
+    storage.delete_channel_lock(guild_id, channel_id)
+    set_lock_expiry("channel", guild_id, channel_id, None)
+    return True
 
-        del locked_channels[guild_id][channel_id]
-        if not locked_channels[guild_id]:
-            del locked_channels[guild_id]
 
-        save_channel_locks()
-        await ctx.send(f"Unlocked {channel.mention}. Everyone can talk now.")
+def lock_timer_key(kind, guild_id, target_id):
+    return f"{kind}:{guild_id}:{target_id}"
+
+def set_lock_expiry(kind, guild_id, target_id, expires_at):
+    """Schedule a role or channel lock to be released at a unix timestamp, or with None make it permanent"""
+    key = lock_timer_key(kind, guild_id, target_id)
+    if expires_at is None:
+        lock_timers.cancel(key)
     else:
-        await ctx.send("This channel is not currently locked.")
+        lock_timers.schedule(key, expires_at, {"kind": kind, "guild": guild_id, "target": target_id})
+
+async def expire_lock(key, payload):
+    """Release a timed lock once its duration is over"""
+    guild_id, target_id = payload["guild"], payload["target"]
+    guild = bot.get_guild(guild_id)
+    if payload["kind"] == "role":
+        released = release_role_lock(guild_id, target_id)
+    else:
+        released = await release_channel_lock(guild, guild_id, target_id)
+    if released:
+        print(f"Timed {payload['kind']} lock on {target_id} in {guild.name if guild else guild_id} expired")
+
+# Pending lock expirations, persisted in storage so they survive restarts
+lock_timers = TimerHeap(storage, "lock_timers", expire_lock)
 
 
 
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The bot's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class MemoryStorage:
+    """The state part of the storage interface, kept in a dict"""
+    def __init__(self):
+        self.state = {}
+
+    def load_state(self, namespace):
+        return dict(self.state.get(namespace, {}))
+
+    def set_state(self, namespace, key, value):
+        self.state.setdefault(namespace, {})[key] = value
+
+    def delete_state(self, namespace, key):
+        self.state.get(namespace, {}).pop(key, None)
+
+
+@pytest.fixture
+def storage():
+    return MemoryStorage()
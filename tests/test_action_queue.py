@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+
+from ActionQueue import PRIORITY_COSMETIC, PRIORITY_MODERATION, ActionQueue
+
+command = contextvars.ContextVar('command', default=None)
+
+
+def run(coro):
+    return asyncio.new_event_loop().run_until_complete(coro)
+
+
+def test_actions_run_in_their_submitters_context():
+    async def main():
+        queue = ActionQueue()
+        seen = []
+
+        async def action():
+            seen.append(command.get())
+
+        async def submit(name):
+            command.set(name)
+            await queue.submit(("channel", 1), action)
+
+        await submit("first")
+        await asyncio.gather(submit("second"), submit("third"))
+        queue.stop()
+        return seen
+
+    assert run(main()) == ["first", "second", "third"]
+
+
+def test_newer_action_with_the_same_key_supersedes_the_pending_one():
+    async def main():
+        queue = ActionQueue()
+        ran = []
+
+        async def action(name):
+            ran.append(name)
+            return name
+
+        blocker = queue.submit(("member_roles", 1), lambda: action("blocker"))
+        first = queue.submit(("member_roles", 1), lambda: action("add"), key=("role", 1, 2))
+        second = queue.submit(("member_roles", 1), lambda: action("remove"), key=("role", 1, 2))
+        results = await asyncio.gather(blocker, first, second)
+        queue.stop()
+        return ran, results, queue.superseded
+
+    ran, results, superseded = run(main())
+    assert ran == ["blocker", "remove"]
+    assert results == ["blocker", "remove", "remove"]
+    assert superseded == 1
+
+
+def test_higher_priority_runs_first():
+    async def main():
+        queue = ActionQueue()
+        ran = []
+
+        async def action(name):
+            ran.append(name)
+
+        route = ("channel", 1)
+        later = queue.submit(route, lambda: action("cosmetic"), priority=PRIORITY_COSMETIC)
+        urgent = queue.submit(route, lambda: action("moderation"), priority=PRIORITY_MODERATION)
+        await asyncio.gather(later, urgent)
+        queue.stop()
+        return ran
+
+    assert run(main()) == ["moderation", "cosmetic"]
@@ -0,0 +1,63 @@
+from AntiNuke import MITIGATION_COOLDOWN, AntiNukeEngine
+
+
+def make_engine(storage, **config):
+    engine = AntiNukeEngine(storage)
+    engine.update(1, enabled=True, rules={"channel_delete": [3, 10]}, **config)
+    return engine
+
+
+def test_triggers_on_more_than_count_events_within_the_window(storage):
+    engine = make_engine(storage)
+    assert [engine.observe(1, 7, "channel_delete", t) for t in (0, 1, 2)] == [None, None, None]
+    assert engine.observe(1, 7, "channel_delete", 3) == (3, 10)
+    assert engine.triggered == 1
+
+
+def test_events_outside_the_window_dont_count(storage):
+    engine = make_engine(storage)
+    for t in (0, 5, 10, 15, 20, 25):
+        assert engine.observe(1, 7, "channel_delete", t) is None
+
+
+def test_actors_and_actions_are_counted_separately(storage):
+    engine = make_engine(storage)
+    for t in range(3):
+        engine.observe(1, 7, "channel_delete", t)
+        engine.observe(1, 8, "channel_delete", t)
+        engine.observe(1, 7, "role_delete", t)
+    assert engine.observe(1, 8, "channel_delete", 3) == (3, 10)
+    assert engine.observe(1, 7, "role_delete", 3) is None  # No rule for it
+
+
+def test_cooldown_suppresses_repeat_triggers(storage):
+    engine = make_engine(storage)
+    for t in range(4):
+        result = engine.observe(1, 7, "channel_delete", t)
+    assert result == (3, 10)
+    # Another burst during the cooldown doesn't mitigate again
+    assert [engine.observe(1, 7, "channel_delete", 4 + t) for t in range(4)] == [None] * 4
+    # After the cooldown it does
+    later = 3 + MITIGATION_COOLDOWN
+    assert [engine.observe(1, 7, "channel_delete", later + t) for t in range(4)][-1] == (3, 10)
+    assert engine.triggered == 2
+
+
+def test_disabled_guilds_trusted_users_and_unknown_actors_are_ignored(storage):
+    engine = make_engine(storage, trusted=[9])
+    for t in range(5):
+        assert engine.observe(1, 9, "channel_delete", t) is None
+        assert engine.observe(1, None, "channel_delete", t) is None
+        assert engine.observe(2, 7, "channel_delete", t) is None
+    engine.update(1, enabled=False)
+    for t in range(5):
+        assert engine.observe(1, 7, "channel_delete", t) is None
+    assert not engine.enabled(1)
+
+
+def test_settings_are_saved(storage):
+    make_engine(storage, timeout_minutes=5)
+    reloaded = AntiNukeEngine(storage)
+    assert reloaded.enabled(1)
+    assert reloaded.config(1)["timeout_minutes"] == 5
+    assert reloaded.config(1)["rules"] == {"channel_delete": [3, 10]}
@@ -0,0 +1,151 @@
+import asyncio
+import datetime
+import time
+from types import SimpleNamespace
+
+from AuditLog import AUDIT_MAX_INTERVAL, AUDIT_MIN_INTERVAL, AUDIT_SCHEMA, AuditLogIngester
+
+
+def make_entry(entry_id, action="channel_delete", user_id=7):
+    return SimpleNamespace(
+        id=entry_id, action=SimpleNamespace(name=action), user_id=user_id, target=SimpleNamespace(id=entry_id * 10),
+        reason=None, created_at=datetime.datetime.fromtimestamp(1_700_000_000 + entry_id, datetime.timezone.utc)
+    )
+
+
+class FakeGuild:
+    def __init__(self, guild_id, entries=()):
+        self.id = guild_id
+        self.name = f"guild {guild_id}"
+        self.entries = list(entries)
+
+    async def audit_logs(self, limit=100, after=None, oldest_first=False):
+        entries = [entry for entry in self.entries if after is None or entry.id > after.id]
+        entries.sort(key=lambda entry: entry.id, reverse=not oldest_first)
+        for entry in entries[:limit]:
+            yield entry
+
+
+def run(coro):
+    return asyncio.new_event_loop().run_until_complete(coro)
+
+
+def test_polls_stream_new_entries_once_and_survive_restart(tmp_path):
+    path = str(tmp_path / "audit.db")
+    guild = FakeGuild(1, [make_entry(1)])
+    seen = []
+
+    async def subscriber(guild, entry):
+        seen.append(entry.id)
+
+    ingester = AuditLogIngester(SimpleNamespace(guilds=[guild]), path=path)
+    ingester.subscribe(subscriber)
+    run(ingester._poll(guild))        # First sight of the guild only records where its log ends
+    guild.entries += [make_entry(2), make_entry(3)]
+    run(ingester._poll(guild))
+    run(ingester._poll(guild))
+    assert seen == [2, 3]
+    assert ingester.checkpoints[1] == 3
+    ingester.close()
+
+    restarted = AuditLogIngester(SimpleNamespace(guilds=[guild]), path=path)
+    restarted.subscribe(subscriber)
+    guild.entries.append(make_entry(4))
+    run(restarted._poll(guild))
+    assert seen == [2, 3, 4]
+    restarted.close()
+
+
+def test_empty_log_starts_from_the_first_entry(tmp_path):
+    guild = FakeGuild(1)
+    seen = []
+
+    async def subscriber(guild, entry):
+        seen.append(entry.id)
+
+    ingester = AuditLogIngester(SimpleNamespace(guilds=[guild]), path=str(tmp_path / "audit.db"))
+    ingester.subscribe(subscriber)
+    run(ingester._poll(guild))
+    guild.entries.append(make_entry(1))
+    run(ingester._poll(guild))
+    assert seen == [1]
+    ingester.close()
+
+
+def test_failed_write_leaves_the_checkpoint_alone(tmp_path):
+    guild = FakeGuild(1, [make_entry(1)])
+    seen = []
+
+    async def subscriber(guild, entry):
+        seen.append(entry.id)
+
+    ingester = AuditLogIngester(SimpleNamespace(guilds=[guild]), path=str(tmp_path / "audit.db"))
+    ingester.subscribe(subscriber)
+    run(ingester._poll(guild))
+    guild.entries.append(make_entry(2))
+
+    ingester._db.execute("DROP TABLE entries")
+    run(ingester._poll(guild))
+    assert ingester.checkpoints[1] == 1 and seen == []
+
+    # Once the database works again the same entries are fetched and delivered
+    ingester._db.executescript(AUDIT_SCHEMA)
+    run(ingester._poll(guild))
+    assert ingester.checkpoints[1] == 2 and seen == [2]
+    assert ingester._db.execute("SELECT last_id FROM checkpoints WHERE guild_id = 1").fetchone() == (2,)
+    ingester.close()
+
+
+def test_poll_soon_polls_a_quiet_guild_right_away(tmp_path):
+    guild = FakeGuild(1)
+    seen = []
+
+    async def subscriber(guild, entry):
+        seen.append(entry.id)
+
+    async def main():
+        ingester = AuditLogIngester(SimpleNamespace(guilds=[guild]), path=str(tmp_path / "audit.db"))
+        ingester.subscribe(subscriber)
+        await ingester._poll(guild)
+        ingester.intervals[1] = AUDIT_MAX_INTERVAL
+        ingester.next_poll[1] = time.monotonic() + AUDIT_MAX_INTERVAL
+        ingester.start()
+        guild.entries.append(make_entry(1))
+        ingester.poll_soon(1)
+        for _ in range(100):
+            if seen:
+                break
+            await asyncio.sleep(0.01)
+        ingester.stop()
+        await asyncio.sleep(0.01)  # Let the cancelled task finish before the loop goes away
+        ingester.close()
+        return ingester
+
+    ingester = run(main())
+    assert seen == [1]
+    assert ingester.intervals[1] == AUDIT_MIN_INTERVAL
+
+
+def test_stop_cancels_running_polls(tmp_path):
+    class StuckGuild(FakeGuild):
+        async def audit_logs(self, limit=100, after=None, oldest_first=False):
+            await asyncio.Event().wait()
+            yield
+
+    guild = StuckGuild(1)
+
+    async def main():
+        ingester = AuditLogIngester(SimpleNamespace(guilds=[guild]), path=str(tmp_path / "audit.db"))
+        ingester.next_poll[1] = 0.0
+        ingester.start()
+        while not ingester._polls:
+            await asyncio.sleep(0.01)
+        polls = list(ingester._polls)
+        ingester.stop()
+        await asyncio.sleep(0.01)
+        ingester.close()
+        return ingester, polls
+
+    ingester, polls = run(main())
+    assert all(task.cancelled() for task in polls)
+    assert not ingester._polls and not ingester._polling
@@ -0,0 +1,82 @@
+import datetime
+import json
+import threading
+
+import pytest
+
+from CommandLog import MAX_RANGE_DAYS, CommandLogWriter, parse_date_range
+
+
+def test_parse_date_range_defaults_to_the_last_week():
+    start, end = parse_date_range([])
+    assert end == datetime.date.today()
+    assert (end - start).days == 6
+
+
+def test_parse_date_range_orders_dates():
+    assert parse_date_range(["2024-03-05", "2024-03-01"]) == (datetime.date(2024, 3, 1), datetime.date(2024, 3, 5))
+
+
+@pytest.mark.parametrize("args", [["9999999"], ["0001-01-01", "9999-12-31"]])
+def test_parse_date_range_clamps_huge_ranges(args):
+    start, end = parse_date_range(args)
+    assert (end - start).days == MAX_RANGE_DAYS - 1
+
+
+@pytest.mark.parametrize("args", [["yesterday"], ["9" * 5000], ["2024-02-30"]])
+def test_parse_date_range_rejects_garbage_with_value_error(args):
+    with pytest.raises(ValueError):
+        parse_date_range(args)
+
+
+def read_log(writer, day):
+    with open(writer.filename_for(day), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_writer_flushes_on_close(tmp_path):
+    writer = CommandLogWriter(directory=str(tmp_path), flush_interval=60)
+    now = datetime.datetime.now()
+    writer.write({"command": "ping"}, now)
+    writer.close()
+    assert read_log(writer, now.date()) == [{"command": "ping"}]
+
+
+def test_writes_after_close_start_a_new_writer(tmp_path):
+    writer = CommandLogWriter(directory=str(tmp_path), flush_interval=60)
+    now = datetime.datetime.now()
+    writer.write({"n": 1}, now)
+    writer.close()
+    writer.write({"n": 2}, now)
+    writer.close()
+    assert read_log(writer, now.date()) == [{"n": 1}, {"n": 2}]
+
+
+def test_writes_racing_close_are_not_lost(tmp_path):
+    writer = CommandLogWriter(directory=str(tmp_path), flush_interval=60)
+    now = datetime.datetime.now()
+    closer = threading.Thread(target=lambda: [writer.close() for _ in range(50)])
+    closer.start()
+    for n in range(500):
+        writer.write({"n": n}, now)
+    closer.join()
+    writer.close()
+    assert [record["n"] for record in read_log(writer, now.date())] == list(range(500))
+
+
+def test_old_text_logs_are_never_archived_or_deleted(tmp_path):
+    (tmp_path / "logs_2000-01-01.txt").write_text("[2000-01-01 00:00:00] ping\n")
+    (tmp_path / "logs_2000-01-01.jsonl").write_text('{"command": "ping"}\n')
+    writer = CommandLogWriter(directory=str(tmp_path), flush_interval=60, retention_days=30)
+    writer.write({"command": "ping"}, datetime.datetime.now())
+    writer.close()
+    assert (tmp_path / "logs_2000-01-01.txt").exists()
+    assert not (tmp_path / "logs_2000-01-01.jsonl").exists()
+
+
+def test_logs_are_kept_forever_by_default(tmp_path):
+    (tmp_path / "logs_2000-01-01.jsonl").write_text('{"command": "ping"}\n')
+    writer = CommandLogWriter(directory=str(tmp_path), flush_interval=60)
+    writer.write({"command": "ping"}, datetime.datetime.now())
+    writer.close()
+    assert (tmp_path / "logs_2000-01-01.jsonl.gz").exists()
@@ -0,0 +1,70 @@
+import asyncio
+
+from Dispatcher import Dispatcher, HeapDispatcher
+
+
+def run(coro):
+    return asyncio.new_event_loop().run_until_complete(coro)
+
+
+async def run_until(dispatcher, condition, timeout=2.0):
+    dispatcher.start()
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.005)
+    task = dispatcher._task
+    dispatcher.stop()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def test_wake_during_a_step_is_not_missed():
+    steps = []
+
+    async def main():
+        async def step():
+            steps.append(len(steps))
+            if len(steps) == 1:
+                dispatcher.wake()  # Arrives while the step runs, the sleep after it must not wait
+            return None
+
+        dispatcher = Dispatcher(step)
+        await run_until(dispatcher, lambda: len(steps) >= 2)
+
+    run(main())
+    assert steps == [0, 1]
+
+
+def test_heap_runs_due_entries_in_order_and_skips_stale_ones():
+    current = {"a": -1.0, "b": 0.0, "c": 5.0}
+    ran = []
+
+    async def main():
+        async def on_due(key, due):
+            ran.append(key)
+
+        dispatcher = HeapDispatcher(on_due, lambda key, due: current.get(key) == due, clock=lambda: 1.0)
+        dispatcher.push(0.0, "b")
+        dispatcher.push(-1.0, "a")
+        dispatcher.push(0.5, "c")  # Rescheduled to 5.0 since, skipped
+        dispatcher.push(5.0, "c")  # Not due yet
+        await run_until(dispatcher, lambda: len(ran) >= 2)
+        return dispatcher
+
+    dispatcher = run(main())
+    assert ran == ["a", "b"]
+    assert dispatcher.heap == [(5.0, "c")]
+
+
+def test_heap_sleep_is_capped_by_max_sleep():
+    async def main():
+        async def on_due(key, due):
+            pass
+
+        dispatcher = HeapDispatcher(on_due, lambda key, due: True, clock=lambda: 0.0, max_sleep=10.0)
+        assert await dispatcher._step() == 10.0
+        dispatcher.push(100.0, "far")
+        assert await dispatcher._step() == 10.0
+        dispatcher.push(2.0, "near")
+        assert await dispatcher._step() == 2.0
+
+    run(main())
@@ -0,0 +1,87 @@
+import asyncio
+
+import Scheduler
+from Scheduler import GuildScheduler
+
+
+def run_scheduler(scheduler, condition, guild_ids=(), timeout=2.0):
+    async def main():
+        scheduler.start()
+        for guild_id in guild_ids:
+            scheduler.ensure(guild_id)
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not condition() and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.005)
+        task = scheduler._dispatcher._task
+        scheduler.stop()
+        await asyncio.gather(task, return_exceptions=True)
+    asyncio.new_event_loop().run_until_complete(main())
+
+
+def fast(monkeypatch):
+    monkeypatch.setattr(Scheduler, "START_INTERVAL", 0.01)
+    monkeypatch.setattr(Scheduler, "MIN_INTERVAL", 0.01)
+    monkeypatch.setattr(Scheduler, "MAX_INTERVAL", 1.0)
+    monkeypatch.setattr(Scheduler, "CONTINUE_DELAY", 0.0)
+    monkeypatch.setattr(Scheduler, "JITTER", 0.0)
+
+
+def test_clean_guilds_back_off_and_drifting_guilds_tighten(monkeypatch):
+    fast(monkeypatch)
+    passes = {1: 0, 2: 0}
+
+    async def check(schedule, deadline):
+        passes[schedule.guild_id] += 1
+        return 1 if schedule.guild_id == 2 else 0
+
+    scheduler = GuildScheduler(check)
+    run_scheduler(scheduler, lambda: passes[1] >= 3, guild_ids=(1, 2))
+    assert scheduler.schedules[1].interval > 0.01
+    assert scheduler.schedules[2].interval == 0.01
+    assert passes[2] > passes[1]
+
+
+def test_pass_out_of_budget_continues_where_it_stopped(monkeypatch):
+    fast(monkeypatch)
+    items = list(range(10))
+    checked = []
+
+    async def check(schedule, deadline):
+        # Checks three items per pass, as if the budget ran out after them
+        chunk = items[schedule.cursor:schedule.cursor + 3]
+        checked.extend(chunk)
+        schedule.cursor = schedule.cursor + 3 if schedule.cursor + 3 < len(items) else 0
+        return len(chunk) if 4 in chunk else 0
+
+    scheduler = GuildScheduler(check)
+    run_scheduler(scheduler, lambda: len(checked) >= 10, guild_ids=(1,))
+    schedule = scheduler.schedules[1]
+    assert checked[:10] == items
+    # The drift found mid-sweep tightens the interval once the sweep completes
+    assert schedule.interval == 0.01 and schedule.violations >= 3
+
+
+def test_guilds_with_nothing_left_are_dropped(monkeypatch):
+    fast(monkeypatch)
+
+    async def check(schedule, deadline):
+        return None
+
+    scheduler = GuildScheduler(check)
+    run_scheduler(scheduler, lambda: not scheduler.schedules, guild_ids=(1,))
+    assert scheduler.schedules == {}
+
+
+def test_failing_checks_dont_stop_other_guilds(monkeypatch):
+    fast(monkeypatch)
+    passes = []
+
+    async def check(schedule, deadline):
+        if schedule.guild_id == 1:
+            raise RuntimeError("boom")
+        passes.append(schedule.guild_id)
+        return 0
+
+    scheduler = GuildScheduler(check)
+    run_scheduler(scheduler, lambda: len(passes) >= 2, guild_ids=(1, 2))
+    assert passes[:2] == [2, 2]
@@ -0,0 +1,100 @@
+import asyncio
+import random
+import time
+
+from Snipes import Snipe, SnipeIndex, SnipeRing, SnipeStore
+
+
+def make_snipe(n, channel_id, length):
+    return Snipe(1, channel_id, 42, "user", None, f"{n}:".ljust(length, "x"), 1_000_000_000 + n)
+
+
+def contents(snipes):
+    return [snipe.content.split(":")[0] for snipe in snipes]
+
+
+def assert_consistent(ring, appended):
+    """The ring holds the newest appends in order, and every channel's recent() agrees with it"""
+    kept = list(ring)
+    assert kept, "the newest record must always survive"
+    assert contents(kept) == appended[len(appended) - len(kept):]
+    for channel_id in {snipe.channel_id for snipe in kept}:
+        expected = [snipe for snipe in kept if snipe.channel_id == channel_id][::-1]
+        assert contents(ring.recent(channel_id, 100)) == contents(expected)
+    return contents(kept)
+
+
+def test_wraparound_keeps_newest_records(tmp_path):
+    path = str(tmp_path / "snipes.ring")
+    ring = SnipeRing(path, size=600, retention_days=0)
+    appended = []
+    lengths = [123, 184, 20, 136, 8, 189, 88, 116]
+    channels = [2, 1, 1, 3, 2, 1, 3, 2]
+    for n, (length, channel_id) in enumerate(zip(lengths, channels)):
+        ring.append(make_snipe(n, channel_id, length))
+        appended.append(str(n))
+        assert_consistent(ring, appended)
+    kept = assert_consistent(ring, appended)
+    ring.close()
+
+    reopened = SnipeRing(path, retention_days=0)
+    assert assert_consistent(reopened, appended) == kept
+    reopened.close()
+
+
+def test_wraparound_fuzz_survives_reopen(tmp_path):
+    for trial in range(200):
+        rng = random.Random(trial)
+        path = str(tmp_path / f"ring{trial}")
+        ring = SnipeRing(path, size=rng.choice([400, 600, 1000, 3000]), retention_days=0)
+        appended = []
+        for n in range(rng.randint(1, 80)):
+            ring.append(make_snipe(n, rng.randint(1, 4), rng.randint(2, 200)))
+            appended.append(str(n))
+            assert_consistent(ring, appended)
+        kept = assert_consistent(ring, appended)
+        ring.close()
+
+        reopened = SnipeRing(path, retention_days=0)
+        assert assert_consistent(reopened, appended) == kept
+        reopened.close()
+
+
+def test_store_reads_evicted_channels_back_from_ring(tmp_path):
+    ring = SnipeRing(str(tmp_path / "snipes.ring"), size=64 * 1024, retention_days=0)
+    store = SnipeStore(per_channel=3, budget=700, ring=ring)  # Room for one channel
+    for n in range(5):
+        store.add(make_snipe(n, 7, 10))
+    store.add(make_snipe(5, 8, 10))  # Over budget, channel 7 is dropped from memory
+    assert contents(store.recent(7)) == ["4", "3", "2"]
+    store.close()
+
+
+def test_index_search_filters_and_pages(tmp_path):
+    index = SnipeIndex(str(tmp_path / "history.db"), retention_days=0)
+    now = time.time()
+    rows = [
+        (Snipe(1, 10, 100, "alice", None, "the quick brown fox", now - 50), "delete", None),
+        (Snipe(1, 11, 200, "bob", None, "quick thinking", now - 40), "edit", "slow thinking"),
+        (Snipe(1, 10, 100, "alice", None, "Quick, hide!", now - 30), "delete", None),
+        (Snipe(2, 20, 100, "alice", None, "quick in another guild", now - 20), "delete", None),
+    ]
+    for snipe, kind, previous in rows:
+        index.add(snipe, kind, previous)
+
+    def search(**filters):
+        results = asyncio.new_event_loop().run_until_complete(index.search(1, **filters))
+        return [result["content"] for result in results]
+
+    assert search(words=["quick"]) == ["Quick, hide!", "quick thinking", "the quick brown fox"]
+    assert search(words=["quick", "fox"]) == ["the quick brown fox"]
+    assert search(words=["slow"]) == ["quick thinking"]  # Matches the content before the edit
+    assert search(author_id=100) == ["Quick, hide!", "the quick brown fox"]
+    assert search(channel_id=11) == ["quick thinking"]
+    assert search(kind="edit") == ["quick thinking"]
+    assert search(after=now - 45, before=now - 35) == ["quick thinking"]
+
+    first = asyncio.new_event_loop().run_until_complete(index.search(1, limit=2))
+    rest = asyncio.new_event_loop().run_until_complete(index.search(1, limit=2, before_id=first[-1]["id"]))
+    assert [r["content"] for r in first + rest] == ["Quick, hide!", "quick thinking", "the quick brown fox"]
+    index.close()
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from Storage import JsonStorage, SqliteStorage
+
+
+def open_json_storage(directory, **kwargs):
+    return JsonStorage(
+        role_file=str(directory / "locked_roles.json"), channel_file=str(directory / "locked_channels.json"),
+        state_files={"mc_boards": str(directory / "mc_boards.json")}, journal_file=str(directory / "state.journal"),
+        **kwargs
+    )
+
+
+def test_changes_are_durable_once_their_future_is_done(tmp_path):
+    storage = open_json_storage(tmp_path, interval=3600)
+    storage.set_role_lock(1, 2, 3).result(timeout=5)
+    with open(tmp_path / "state.journal") as f:
+        assert [json.loads(line) for line in f] == [{"file": "role_locks", "keys": ["1", "2"], "value": "3"}]
+    storage.close()
+
+
+def test_journal_is_replayed_after_a_crash(tmp_path):
+    storage = open_json_storage(tmp_path, interval=3600)
+    storage.set_role_lock(1, 2, 3)
+    storage.set_channel_lock(1, 5, [7, 8])
+    storage.set_state("mc_boards", 1, {"channel_id": 9})
+    storage.delete_role_lock(1, 2)
+    storage.set_role_lock(1, 4, 6).result(timeout=5)
+    # No close(), so no snapshot was written, and the last record was cut off mid-append
+    with open(tmp_path / "state.journal", "a") as f:
+        f.write('{"file": "role_locks", "keys": ["1", "9"')
+
+    reopened = open_json_storage(tmp_path, interval=3600)
+    assert reopened.load_role_locks() == {1: {4: 6}}
+    assert reopened.load_channel_locks() == {1: {5: frozenset({7, 8})}}
+    assert reopened.load_state("mc_boards") == {"1": {"channel_id": 9}}
+
+    # New records after the torn line still replay
+    reopened.set_role_lock(1, 10, 11).result(timeout=5)
+    reopened.close()
+    assert open_json_storage(tmp_path, interval=3600).load_role_locks() == {1: {4: 6, 10: 11}}
+
+
+def test_snapshot_folds_the_journal_into_the_files(tmp_path):
+    storage = open_json_storage(tmp_path, interval=3600)
+    storage.set_channel_lock(1, 5, [7])
+    storage.flush()
+    storage.set_channel_lock(1, 6, [8]).result(timeout=5)
+    storage.close()
+
+    with open(tmp_path / "locked_channels.json") as f:
+        assert json.load(f) == {"1": {"5": ["7"], "6": ["8"]}}
+    assert not (tmp_path / "state.journal.old").exists()
+    assert open_json_storage(tmp_path, interval=3600).load_channel_locks() == {1: {5: frozenset({7}), 6: frozenset({8})}}
+
+
+def test_snapshots_are_not_changed_by_later_writes(tmp_path):
+    storage = open_json_storage(tmp_path, interval=3600)
+    value = {"servers": ["a"]}
+    storage.set_state("mc_boards", 1, value)
+    before = storage._data["mc_boards"]
+    value["servers"].append("b")
+    storage.set_state("mc_boards", 2, {})
+    assert before == {"1": {"servers": ["a"]}}
+    storage.close()
+
+
+def test_changes_after_close_are_refused(tmp_path):
+    storage = open_json_storage(tmp_path, interval=3600)
+    storage.close()
+    with pytest.raises(RuntimeError):
+        storage.set_role_lock(1, 2, 3)
+
+
+def test_sqlite_keeps_channel_locks_nobody_is_allowed_in(tmp_path):
+    path = str(tmp_path / "osmium.db")
+    storage = SqliteStorage(path)
+    storage.set_channel_lock(1, 5, [])
+    storage.set_channel_lock(1, 6, [7, 8])
+    storage.set_channel_lock(1, 6, [8])
+    storage.set_channel_lock(1, 9, [7])
+    storage.delete_channel_lock(1, 9)
+    storage.close()
+
+    reopened = SqliteStorage(path)
+    assert reopened.load_channel_locks() == {1: {5: frozenset(), 6: frozenset({8})}}
+    reopened.close()
+
+
+def test_sqlite_migrates_json_files_once(tmp_path):
+    (tmp_path / "locked_roles.json").write_text(json.dumps({"1": {"2": "3"}}))
+    (tmp_path / "locked_channels.json").write_text(json.dumps({"1": {"5": [], "6": ["7"]}}))
+    (tmp_path / "mc_boards.json").write_text(json.dumps({"1": {"servers": ["a"]}}))
+    files = {"role_file": str(tmp_path / "locked_roles.json"), "channel_file": str(tmp_path / "locked_channels.json"),
+             "state_files": {"mc_boards": str(tmp_path / "mc_boards.json")}}
+
+    storage = SqliteStorage(str(tmp_path / "osmium.db"))
+    storage.migrate_json(**files)
+    storage.delete_role_lock(1, 2).result()
+    storage.migrate_json(**files)  # Already migrated, the deleted lock stays deleted
+    assert storage.load_role_locks() == {}
+    assert storage.load_channel_locks() == {1: {5: frozenset(), 6: frozenset({7})}}
+    assert storage.load_state("mc_boards") == {"1": {"servers": ["a"]}}
+    storage.close()
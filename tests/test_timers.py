@@ -0,0 +1,85 @@
+import asyncio
+import datetime
+
+import pytest
+
+import Timers
+from Timers import TimerHeap, looks_like_duration, parse_duration
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("30m", datetime.timedelta(minutes=30)),
+    ("1d12h", datetime.timedelta(days=1, hours=12)),
+    (" 2H 5s ", datetime.timedelta(hours=2, seconds=5)),
+    ("1w", datetime.timedelta(weeks=1)),
+])
+def test_parse_duration(text, expected):
+    assert parse_duration(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "abc", "10", "5x", "1d junk", "0m", "99999999999d", "9" * 5000 + "s", "3651d"])
+def test_parse_duration_rejects(text):
+    assert parse_duration(text) is None
+
+
+def test_parse_duration_allows_the_maximum():
+    assert parse_duration("3650d") == Timers.MAX_DURATION
+
+
+@pytest.mark.parametrize("text, expected", [("30m", True), (" 5x", True), ("99999999999d", True), ("bob", False), ("", False)])
+def test_looks_like_duration(text, expected):
+    assert looks_like_duration(text) is expected
+
+
+def run_until(heap, condition, timeout=2.0):
+    async def main():
+        heap.start()
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not condition() and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.01)
+        task = heap._dispatcher._task
+        heap.stop()
+        await asyncio.gather(task, return_exceptions=True)
+    asyncio.new_event_loop().run_until_complete(main())
+
+
+def test_timer_fires_once_and_is_dropped(storage):
+    fired = []
+
+    async def on_expire(key, payload):
+        fired.append((key, payload))
+
+    heap = TimerHeap(storage, "timers", on_expire)
+    heap.schedule("a", 0, {"n": 1})
+    run_until(heap, lambda: fired)
+    assert fired == [("a", {"n": 1})]
+    assert len(heap) == 0 and storage.state["timers"] == {}
+
+
+def test_failed_expiry_is_retried_until_it_succeeds(monkeypatch, storage):
+    monkeypatch.setattr(Timers, "RETRY_DELAY", 0.01)
+    attempts = []
+
+    async def on_expire(key, payload):
+        attempts.append(key)
+        if len(attempts) < 3:
+            raise RuntimeError("Forbidden")
+
+    heap = TimerHeap(storage, "timers", on_expire)
+    heap.schedule("a", 0, {})
+    # The timer stays in storage while it keeps failing
+    run_until(heap, lambda: len(attempts) >= 1 and "a" in storage.state["timers"], timeout=0.5)
+    assert "a" in storage.state["timers"]
+    run_until(heap, lambda: len(heap) == 0)
+    assert attempts == ["a", "a", "a"]
+    assert storage.state["timers"] == {}
+
+
+def test_timers_survive_a_restart(storage):
+
+    async def on_expire(key, payload):
+        pass
+
+    TimerHeap(storage, "timers", on_expire).schedule("a", 123.0, {"kind": "role"})
+    restarted = TimerHeap(storage, "timers", on_expire)
+    assert restarted.expires_at("a") == 123.0